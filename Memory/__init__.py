@@ -0,0 +1,2 @@
+# The Memory game: find the pairs of pictures hidden under the tiles.
+from .memory import main, replay, Game, Tile, ImageCache, DirtyRects, MemoryState, WINDOW_SIZE
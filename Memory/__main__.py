@@ -0,0 +1,3 @@
+from .memory import main
+
+main()
@@ -0,0 +1,224 @@
+import random, time, sys, argparse, os, statistics, collections
+from concurrent.futures import ProcessPoolExecutor
+
+from .memory import Game
+
+
+# Agents play Memory without a mouse. Before every click the Engine asks the
+# agent's pick() for the index of a covered tile, and after every click it
+# tells the agent's seen() which image the tile showed. start() is called
+# once at the beginning of each game.
+
+class RandomAgent: # RandomAgent class
+    # An object in this class clicks covered tiles at random and remembers nothing
+
+    def __init__(self, rng=None):
+        # - rng is the random.Random the tiles are picked with
+        self.rng = rng if rng is not None else random.Random()
+
+    def start(self, game):
+        pass
+
+    def pick(self, game):
+        state = game.state
+        while True:
+            index = self.rng.randrange(game.tiletotal)
+            if state.covered >> index & 1 and index != state.first:
+                return index
+
+    def seen(self, index, image):
+        pass
+
+
+class RecallAgent: # RecallAgent class
+    # An object in this class remembers the images of the tiles it has seen,
+    # the capacity most recent ones or all of them. It clicks a pair it knows
+    # if there is one, the partner of its first tile if it knows it, and
+    # otherwise a tile it doesn't remember.
+
+    def __init__(self, rng=None, capacity=None):
+        # - rng is the random.Random the unknown tiles are picked with
+        # - capacity is how many tiles the agent remembers, None for all of them
+        self.rng = rng if rng is not None else random.Random()
+        self.capacity = capacity
+
+    def start(self, game):
+        # the image of every remembered tile, the oldest memory first
+        self.memory = collections.OrderedDict()
+
+    def pick(self, game):
+        state = game.state
+        covered = state.covered
+        if state.turn == 0:
+            # a remembered pair of covered tiles is a sure match
+            first_of = {}
+            for index, image in self.memory.items():
+                if covered >> index & 1:
+                    if image in first_of:
+                        return first_of[image]
+                    first_of[image] = index
+        else:
+            image = state.images[state.first]
+            for index, remembered in self.memory.items():
+                if remembered == image and index != state.first and covered >> index & 1:
+                    return index
+        return self.pick_unknown(game)
+
+    def pick_unknown(self, game):
+        # Return a covered tile that isn't remembered, or any covered tile if
+        # every one is remembered. Most picks are found by a few random tries.
+        state = game.state
+        covered = state.covered
+        for attempt in range(32):
+            index = self.rng.randrange(game.tiletotal)
+            if covered >> index & 1 and index != state.first and index not in self.memory:
+                return index
+        choices = [index for index in range(game.tiletotal) if covered >> index & 1 and index != state.first]
+        unknown = [index for index in choices if index not in self.memory]
+        return self.rng.choice(unknown or choices)
+
+    def seen(self, index, image):
+        self.memory[index] = image
+        self.memory.move_to_end(index)
+        if self.capacity is not None and len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+
+class PerfectRecallAgent(RecallAgent): # PerfectRecallAgent class
+    # An object in this class remembers every tile it has seen
+
+    def __init__(self, rng=None):
+        RecallAgent.__init__(self, rng)
+
+
+class ForgetfulAgent(RecallAgent): # ForgetfulAgent class
+    # An object in this class only remembers the last few tiles it saw, a bit
+    # more like a person
+
+    def __init__(self, rng=None, capacity=6):
+        RecallAgent.__init__(self, rng, capacity)
+
+
+# The agents the tournament can play, by name
+AGENTS = {
+    'random': RandomAgent,
+    'forgetful': ForgetfulAgent,
+    'perfect': PerfectRecallAgent,
+}
+
+
+class Engine: # Engine class
+    # An object in this class lets an agent play Memory games without a window
+    # or a clock. A turn ends as soon as both tiles are shown, without the
+    # second the real game waits.
+
+    def __init__(self, agent, rows=4, columns=4, max_turns=100000):
+        # Initialize an Engine.
+        # - self is the Engine to initialize
+        # - agent picks the tiles, see the agents above
+        # - rows and columns give the size of the boards
+        # - max_turns ends a game an agent can't finish
+        self.agent = agent
+        self.rows = rows
+        self.columns = columns
+        self.max_turns = max_turns
+        # these keep count of the work done over every game played
+        self.games = 0
+        self.seconds = 0.0
+
+    def play_game(self, seed=None):
+        # Play one game to the end and return (turns, mismatches).
+        # - self is the Engine
+        # - seed deals the board
+        start = time.perf_counter()
+        game = Game(None, self.rows, self.columns, event_driven=False, seed=seed)
+        agent = self.agent
+        agent.start(game)
+        state = game.state
+        images = state.images
+        turns = 0
+        mismatches = 0
+        while game.continue_game and turns < self.max_turns:
+            for click in range(2):
+                index = agent.pick(game)
+                game.reveal(game.tiles[index])
+                agent.seen(index, images[index])
+            if images[state.first] != images[state.second]:
+                mismatches += 1
+            game.end_turn()
+            game.decide_continue()
+            turns += 1
+        self.seconds += time.perf_counter() - start
+        self.games += 1
+        return turns, mismatches
+
+    def games_per_second(self):
+        # Return how many games per second were played so far.
+        if self.seconds == 0:
+            return 0.0
+        return self.games / self.seconds
+
+
+def play_chunk(agent_name, rows, columns, seeds):
+    # Play one game per seed with a new agent of the given name and return
+    # the list of (turns, mismatches). The tournament runs this in worker processes.
+    results = []
+    for seed in seeds:
+        engine = Engine(AGENTS[agent_name](random.Random(seed)), rows, columns)
+        results.append(engine.play_game(seed))
+    return results
+
+
+def summarize(results):
+    # Return the mean, median and 95th percentile of the turns, and the mean mismatches.
+    turns = sorted(result[0] for result in results)
+    return {
+        'games': len(results),
+        'mean_turns': statistics.fmean(turns),
+        'median_turns': statistics.median(turns),
+        'p95_turns': turns[min(len(turns) - 1, int(round(0.95 * (len(turns) - 1))))],
+        'mean_mismatches': statistics.fmean(result[1] for result in results),
+    }
+
+
+def run_tournament(agent_names, games, rows=4, columns=4, seed=0, workers=None, chunk_size=250):
+    # Play games seeded games of every named agent, spread over a pool of
+    # worker processes, and return ({agent name: summary}, seconds).
+    # Every agent gets the same boards, dealt from the seeds seed to seed + games - 1.
+    seeds = list(range(seed, seed + games))
+    chunks = [seeds[i:i + chunk_size] for i in range(0, games, chunk_size)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: [pool.submit(play_chunk, name, rows, columns, chunk) for chunk in chunks] for name in agent_names}
+        summaries = {}
+        for name, chunk_futures in futures.items():
+            results = []
+            for future in chunk_futures:
+                results.extend(future.result())
+            summaries[name] = summarize(results)
+    return summaries, time.perf_counter() - start
+
+
+def main(argv=None): # main function
+    parser = argparse.ArgumentParser(description='Play many Memory games with computer agents and compare them.')
+    parser.add_argument('--games', type=int, default=1000, help='games per agent')
+    parser.add_argument('--rows', type=int, default=4)
+    parser.add_argument('--columns', type=int, default=4)
+    parser.add_argument('--agents', nargs='+', choices=sorted(AGENTS), default=sorted(AGENTS))
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first board')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, by default one per core')
+    args = parser.parse_args(argv)
+
+    summaries, seconds = run_tournament(args.agents, args.games, args.rows, args.columns, args.seed, args.workers)
+    print('%-10s %7s %10s %8s %8s %11s' % ('agent', 'games', 'mean turns', 'median', 'p95', 'mismatches'))
+    for name, summary in summaries.items():
+        print('%-10s %7d %10.2f %8.1f %8d %11.2f' % (name, summary['games'], summary['mean_turns'],
+                                                    summary['median_turns'], summary['p95_turns'], summary['mean_mismatches']))
+    total = args.games * len(args.agents)
+    print('%d games on a %d x %d board in %.2f s with %d workers, %.0f games per second'
+          % (total, args.rows, args.columns, seconds, args.workers or os.cpu_count(), total / seconds))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,21 +1,98 @@
-import pygame, random
+import pygame, random, collections, os, array, argparse
 
+from common.hud import HudText
+from common.startup import init_pygame, StartupTimer
+from common.profiler import FrameProfiler, PROFILE_CSV_VARIABLE
+from common.rewind import RewindBuffer
+from common.replay import RealClock, VirtualClock, recording_from_env, save_recording, CLICK, KEY, QUIT
+from common.capture import capture_from_env, close_capture
+from .themes import open_theme, ImageLoader
 
-def main():
-    # initialize all pygame modules (some need initialization)
-    pygame.init()
+
+# the size of the window in pixels
+WINDOW_SIZE = (560, 450)
+
+# the phases of a frame that the profiler times, in the order play() runs them
+PROFILE_PHASES = ('handle_events', 'update', 'decide_continue', 'draw', 'display.update')
+
+# the timer events of the event driven game: the end of a turn's one second
+# delay and the next whole second of the score
+TURN_EVENT = pygame.event.custom_type()
+SCORE_EVENT = pygame.event.custom_type()
+# the event the image loader posts when it has decoded an image
+IMAGE_READY_EVENT = pygame.event.custom_type()
+
+# the size and color of the stand-in for an image that is still being decoded
+PLACEHOLDER_SIZE = (100, 100)
+PLACEHOLDER_COLOR = (60, 60, 60)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Find the pairs of pictures hidden under the tiles.')
+    parser.add_argument('--theme', help='a theme pack (.zip) to play with instead of the game\'s own pictures')
+    parser.add_argument('--rows', type=int, default=4)
+    parser.add_argument('--columns', type=int, default=4)
+    args = parser.parse_args(argv)
+    options = {'rows': args.rows, 'columns': args.columns, 'theme': args.theme}
+    # time the start so a slow launch shows up
+    startup = StartupTimer('Memory')
+    # initialize only the pygame modules the game uses
+    init_pygame()
+    startup.mark('init')
     # create a pygame display window
-    pygame.display.set_mode((560, 450))
+    pygame.display.set_mode(WINDOW_SIZE)
     # set the title of the display window
     pygame.display.set_caption('Memory')   
+    startup.mark('display')
     # get the display surface
     w_surface = pygame.display.get_surface() 
-    # create a game object
-    game = Game(w_surface)
+    # create a game object, a recorded game uses a seed and a clock that can be played again
+    input_log = recording_from_env('Memory', 1000 / 60, options)
+    if input_log is None:
+        game = Game(w_surface, **options)
+    else:
+        game = Game(w_surface, event_driven=False, seed=input_log.seed, clock=VirtualClock(input_log.frame_ms), input_log=input_log, **options)
+    startup.mark('game')
+    startup.finish()
+    # the frame profile is written out on exit or on SIGUSR1 if a file is named
+    game.profiler.csv_path = os.environ.get(PROFILE_CSV_VARIABLE)
+    game.profiler.watch_signal()
+    # the frames are captured to a file or an encoder if one is named
+    game.capture = capture_from_env(w_surface)
     # start the main game loop by calling the play method on the game object
     game.play() 
+    game.close()
+    game.profiler.close()
+    save_recording(input_log)
     # quit pygame and clean up the pygame window
     pygame.quit() 
+    # the capture is finished last, it raises what went wrong writing it, if anything
+    close_capture(game.capture)
+
+
+def replay(log, surface=None):
+    # Play a recorded session again as fast as the computer can and return the Game.
+    # - log is the InputLog of the session
+    # - surface is the surface to draw on, or None to skip drawing
+    game = Game(surface, event_driven=False, seed=log.seed, clock=VirtualClock(log.frame_ms), **log.options)
+    frames = log.frames()
+    last_frame = log.last_frame()
+    while not game.close_clicked and game.frame <= last_frame:
+        events = [replay_event(event) for event in frames.get(game.frame, ())]
+        game.play_frame(events)
+        game.clock.frame(0)
+    game.close()
+    return game
+
+
+def replay_event(event):
+    # Turn a recorded (frame, kind, a, b) event back into a pygame event.
+    frame, kind, a, b = event
+    if kind == CLICK:
+        return pygame.event.Event(pygame.MOUSEBUTTONUP, pos=(a, b), button=1)
+    if kind == KEY:
+        return pygame.event.Event(pygame.KEYDOWN, key=a)
+    return pygame.event.Event(pygame.QUIT)
 
 
 # User-defined classes
@@ -23,10 +100,17 @@ def main():
 class Game:
    # An object in this class represents a complete game.
 
-    def __init__(self, surface):
+    def __init__(self, surface, rows=4, columns=4, event_driven=True, seed=None, clock=None, input_log=None, theme=None):
       # Initialize a Game.
       # - self is the Game to initialize
-      # - surface is the display window surface object
+      # - surface is the display window surface object, or None to play without drawing
+      # - rows and columns give the size of the board, their product must be even
+      # - event_driven is True to sleep until something happens instead of
+      #   running FPS frames every second
+      # - seed seeds the shuffle, the same seed deals the same board
+      # - clock tells the time, a RealClock unless another one is given
+      # - input_log is an InputLog that the player's input is recorded to, or None
+      # - theme is the theme pack (.zip) to take the pictures from, or None for the game's own
       
       # === objects that are part of every game that we will discuss
         self.surface = surface
@@ -36,85 +120,208 @@ class Game:
         self.game_Clock = pygame.time.Clock()
         self.close_clicked = False
         self.continue_game = True
+        self.event_driven = event_driven
+        # the game keeps its own time, pygame's clock only runs after pygame.init()
+        self.clock = clock if clock is not None else RealClock()
+        # the game's own random numbers, so a seed is all it takes to deal the same board again
+        self.rng = random.Random(seed)
+        self.input_log = input_log
+        # the number of frames played so far
+        self.frame = 0
         
         # === game specific objects
         
-        # list containing images in system
-        imageTitles = ["image1.bmp", "image2.bmp", "image3.bmp", "image4.bmp", "image5.bmp", "image6.bmp", "image7.bmp", "image8.bmp"]
-        # images will contain all the images, but twice and then it will be shuffled
-        images = []
-        for imageTitle in imageTitles:
-           #image = pygame.image.load(imageTitle)
-            images.append(imageTitle)
-            images.append(imageTitle)
-        random.shuffle(images) # shuffle images
+        # every tile needs a partner, so the board must have an even number of tiles
+        if rows * columns % 2 != 0:
+            raise ValueError('a %d x %d board has an odd number of tiles' % (rows, columns))
+        self.rows = rows
+        self.columns = columns
+        # self.tiletotal is the number of tiles that must be exposed to win
+        self.tiletotal = rows * columns
         
-        self.images = images
+        # the theme holds the pictures, a tile's image id is its position in imageTitles
+        self.theme = open_theme(theme)
+        imageTitles = self.theme.images
+        self.imageTitles = imageTitles
+        # a theme with more pictures than the board has pairs deals a random few of them
+        pairs = self.tiletotal // 2
+        if pairs < len(imageTitles):
+            dealt = self.rng.sample(range(len(imageTitles)), pairs)
+        else:
+            dealt = list(range(len(imageTitles)))
+        # images will contain one image id for every pair on the board, twice, and then
+        # it will be shuffled. Big boards use the image titles over again.
+        images = []
+        for pair in range(pairs):
+            images.append(dealt[pair % len(dealt)])
+            images.append(dealt[pair % len(dealt)])
+        self.rng.shuffle(images) # shuffle images, this deals the whole board at once
         
-        # self.tile1 will represent the first tile and
-        # self.tile2 the second tile
-        self.tile1 = None
-        self.tile2 = None
-        # self.timing will help keep count of timing between turns
-        self.timing = 0
-        # self.tilecount will keep track of number of exposed tiles
-        self.tilecount = 0
+        # self.state holds everything that changes during a game in a few numbers,
+        # with the image ids of the tiles in a flat array in row order
+        self.state = MemoryState(array.array('H', images), self.tiletotal)
+        # the states of the latest frames, the r key steps back through them
+        self.history = RewindBuffer(600, MemoryState)
         
         # self.score will help keep track of the time as a score
         self.score = [0]
         
-        # self.turn will help keep track of player turns for each tile
-        self.turn = 0
-        # the strings below will give the image name for both tiles
-        self.turn_str1 = ""
-        self.turn_str2 = ""
-        
         # the following image will be the cover image needed
-        self.image0 = "image0.bmp"
+        self.image0 = self.theme.cover
+        
+        # every tile gets its surfaces from this one cache, so each image is
+        # decoded and converted to the display format only once. A game with a
+        # window decodes the cover and the dealt pictures on a loader thread,
+        # a game without one never draws them.
+        if surface is None:
+            self.loader = None
+        else:
+            self.loader = ImageLoader(self.theme, IMAGE_READY_EVENT)
+            self.loader.request([self.image0] + [imageTitles[image] for image in dealt])
+        self.image_cache = ImageCache(theme=self.theme, loader=self.loader)
+        
+        # tiles and the score register the rectangles they change here and
+        # play() pushes them to the display once per frame
+        self.dirty_rects = DirtyRects()
+        # the score rectangle and value that are currently on the surface
+        self.score_rect = None
+        self.drawn_score = None
+        # the score text keeps its font and each rendered value, so it is
+        # only rendered when the score changes
+        self.score_text = HudText('', 60, 'white', self.bg_color, system=True)
+        
+        # the profiler times every frame, F3 shows its overlay
+        self.profiler = FrameProfiler(PROFILE_PHASES)
+        # a FrameCapture that copies every changed frame, or None
+        self.capture = None
         
         # the below variables give the tile height a width needed
-        tile_height = self.surface.get_height() // 4 # each tile height
-        tile_width = 3/4*self.surface.get_width() // 4 # each tile width        
+        width, height = WINDOW_SIZE if surface is None else surface.get_size()
+        tile_height = height // rows # each tile height
+        tile_width = 3/4*width // columns # each tile width        
+        # keep them, handle_mouse_up() uses them to find the clicked tile
+        self.tile_height = tile_height
+        self.tile_width = tile_width
         
         # Create the board
-        # self.board wil contain the tiles as a nested list
+        # self.board wil contain the tiles as a nested list and self.tiles
+        # the same tiles in one list, in the order of the state's arrays
         self.board = []
-        for row in range(0, 4):
-            rows = []
-            for column in range(0, 4):
+        self.tiles = []
+        for row in range(0, rows):
+            tiles = []
+            for column in range(0, columns):
         
                 x = column * tile_width # this gives x position of tile as on surface 
                 y = row * tile_height # this gives y position of tile as on surface
                 tilePosition = [x, y, tile_width, tile_height] # create the tile
-                # using random.choice() let us again randomly select an image
-                image = random.choice(images)
-                self.images.remove(image)     
+                # the images are already shuffled, so the tiles just take them in order
+                index = row * columns + column
+                image = imageTitles[images[index]]
                 # finally the image variable is used as the picture for this specific tile
                 # at its position
-                tile = Tile(tilePosition, self.image0, image, surface)
+                tile = Tile(tilePosition, self.image0, image, surface, self.image_cache, self.dirty_rects, self.state, index)
                 # let us now draw the card, since it is initially not exposed I have hidden
                 # it by using image0
                 tile.hide_card()
-                # finally append the tile to rows
-                rows.append(tile)
+                # finally append the tile to tiles
+                tiles.append(tile)
+                self.tiles.append(tile)
         
-            self.board.append(rows) # at the end of each row append it to the whole self.board
+            self.board.append(tiles) # at the end of each row append it to the whole self.board
+
+        # the board as dealt is the first state r can go back to
+        self.history.push().copy_from(self.state)
 
     def play(self):
         # Play the game until the player presses the close box.
         # - self is the Game that should be continued or not.
+        if self.event_driven:
+            self.play_event_driven()
+            return
     
         while not self.close_clicked:  # until player clicks close box
-           # play frame
-            self.handle_events()
+            self.play_frame(pygame.event.get())
+            # run at most with FPS Frames Per Second, the game's clock moves on by the frame's time
+            self.clock.frame(self.game_Clock.tick(self.FPS))
+
+    def play_frame(self, events):
+        # Play one frame of the polling game, timing each phase of it.
+        # - self is the Game
+        # - events is the list of this frame's pygame events
+        profiler = self.profiler
+        profiler.begin_frame()
+        for event in events:
+            self.handle_event(event)
+        profiler.mark(0)
+        
+        if self.continue_game:
+            self.update()
+            profiler.mark(1)
+            self.decide_continue()
+            profiler.mark(2)
+            self.draw()
+        if profiler.visible:
+            self.dirty_rects.add(profiler.draw(self.surface))
+        profiler.mark(3)
+        
+        # push only the rectangles that changed this frame, if any
+        self.show()
+        profiler.mark(4)
+        profiler.end_frame()
+        self.record()
+        self.frame += 1
+
+    def play_event_driven(self):
+        # Play the game, sleeping until an event arrives instead of polling.
+        # - self is the Game to play
+        # The end of a turn and the score's seconds come as timer events, and a
+        # frame only draws what those events and the player's clicks changed.
+        profiler = self.profiler
+        self.schedule_score_tick()
+        self.draw()
+        self.show()
+
+        while not self.close_clicked:  # until player clicks close box
+            # sleep until there is an event, then take every one that is waiting
+            events = [pygame.event.wait()] + pygame.event.get()
+            profiler.begin_frame()
+            for event in events:
+                self.handle_event(event)
+            profiler.mark(0)
             
             if self.continue_game:
-                self.update()
+                # there is nothing to poll in update(), the timers send events instead
+                profiler.mark(1)
                 self.decide_continue()
+                profiler.mark(2)
                 self.draw()
-                pygame.display.update()
-              
-            self.game_Clock.tick(self.FPS) # run at most with FPS Frames Per Second 
+            if profiler.visible:
+                self.dirty_rects.add(profiler.draw(self.surface))
+            profiler.mark(3)
+            
+            self.show()
+            profiler.mark(4)
+            profiler.end_frame()
+            self.record()
+            self.frame += 1
+
+        # stop the timers, the game is over
+        pygame.time.set_timer(TURN_EVENT, 0)
+        pygame.time.set_timer(SCORE_EVENT, 0)
+
+    def schedule_score_tick(self): # this method asks for a SCORE_EVENT at the next whole second
+        pygame.time.set_timer(SCORE_EVENT, 1000 - self.ticks() % 1000, 1)
+
+    def show(self): # this method pushes the changed rectangles to the display and captures the frame if any changed
+        if self.dirty_rects.update() and self.capture is not None:
+            self.capture.capture(self.surface, self.frame, self.ticks())
+
+    def ticks(self): # this method returns the milliseconds since the game started
+        return self.clock.ticks()
+
+    def describe(self): # this method returns a short summary of the game, replays print it
+        return 'matched %d of %d tiles, score %d, covered mask %x' % (self.state.tilecount, self.tiletotal, self.score[0], self.state.covered)
 
     def handle_events(self):
         # Handle each user event by changing the game state appropriately.
@@ -122,110 +329,353 @@ class Game:
     
         events = pygame.event.get()
         for event in events:
-            if event.type == pygame.QUIT:
-                self.close_clicked = True
+            self.handle_event(event)
+
+    def handle_event(self, event):
+        # Change the game state for one user or timer event.
+        # - self is the Game whose event will be handled
+        # - event is the pygame event
+        if self.input_log is not None:
+            self.log_input(event)
+
+        if event.type == pygame.QUIT:
+            self.close_clicked = True
     
-            if event.type == pygame.MOUSEBUTTONUP:
-                # ie if mousebuttonup is pressed then we use handle_mouse_up function
-                self.handle_mouse_up(event.pos)         
+        if event.type == pygame.MOUSEBUTTONUP:
+            # ie if mousebuttonup is pressed then we use handle_mouse_up function
+            self.handle_mouse_up(event.pos)         
+        
+        if event.type == TURN_EVENT and self.state.turn == 2:
+            # the second after the second tile was exposed is over
+            self.end_turn()
+        
+        if event.type == SCORE_EVENT and self.continue_game:
+            # draw() shows the new score, and the next second is asked for here
+            self.schedule_score_tick()
+        
+        if event.type == IMAGE_READY_EVENT:
+            # a picture was decoded, the tiles showing its placeholder get it now
+            self.image_ready(event.image)
+        
+        if event.type == pygame.VIDEOEXPOSE:
+            # the window was uncovered, so the whole of it must be redrawn
+            self.dirty_rects.add(self.surface.get_rect())
+        
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+            # step back to the state before the latest change
+            self.rewind()
+        
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            # show or hide the profiler overlay, the board under it is redrawn when it goes
+            self.profiler.toggle()
+            if not self.profiler.visible:
+                self.redraw()
+
+    def image_ready(self, filename): # this method redraws the tiles that show an image that was just decoded
+        for tile in self.tiles:
+            if (tile.image0 if tile.covered else tile.image) == filename:
+                tile.draw()
+
+    def close(self): # this method stops the image loader and closes the theme
+        if self.loader is not None:
+            self.loader.close()
+        self.theme.close()
+
+    def log_input(self, event): # this method records the player's input for a replay
+        if event.type == pygame.QUIT:
+            self.input_log.record(self.frame, QUIT)
+        elif event.type == pygame.MOUSEBUTTONUP:
+            self.input_log.record(self.frame, CLICK, event.pos[0], event.pos[1])
+        elif event.type == pygame.KEYDOWN and event.key == pygame.K_r:
+            self.input_log.record(self.frame, KEY, event.key)
+
+    def record(self): # this method keeps the state of this frame if it changed since the last one
+        latest = self.history.peek()
+        if latest is None or not latest.same_as(self.state):
+            self.history.push().copy_from(self.state)
+
+    def rewind(self): # this method goes back to the latest recorded state that differs from now
+        snapshot = self.history.pop()
+        while snapshot is not None and snapshot.same_as(self.state):
+            snapshot = self.history.pop()
+        if snapshot is not None:
+            self.restore(snapshot)
+
+    def restore(self, snapshot): # this method makes a recorded state the current one
+        state = self.state
+        # only the tiles whose covered bit differs need to be drawn again
+        changed = state.covered ^ snapshot.covered
+        state.copy_from(snapshot)
+        while changed:
+            lowest = changed & -changed
+            self.tiles[lowest.bit_length() - 1].draw()
+            changed ^= lowest
+        was_over = not self.continue_game
+        self.continue_game = state.tilecount < self.tiletotal
+        # a won game stopped the score's timer, so going back into play starts it again
+        if was_over and self.continue_game and self.event_driven:
+            self.schedule_score_tick()
+        # a turn that is waiting out its second gets the whole second again, its
+        # old timing has passed and would end the turn at once
+        if state.turn == 2:
+            state.timing = self.ticks() + 1000
+            if self.event_driven:
+                pygame.time.set_timer(TURN_EVENT, 1000, 1)
+
+    def redraw(self): # this method draws the whole window again
+        if self.surface is None:
+            return
+        self.surface.fill(self.bg_color)
+        for row in self.board:
+            for tile in row:
+                tile.draw()
+        # forget the drawn score so that draw() puts it back
+        self.drawn_score = None
+        self.score_rect = None
+        self.dirty_rects.add(self.surface.get_rect())
 
     def draw(self):
       # The following code will be used to draw the score at the top corner.
         if self.continue_game == True:
-            ticks = pygame.time.get_ticks()
+            ticks = self.ticks()
             self.score[0] = (ticks // 1000) - 1
-            fg_color = pygame.Color('white')
-            # 2.create the font object
-            font = pygame.font.SysFont('', 60)
-            # 3 Create a text box by rendering the font
-            text_box = font.render(str(self.score[0]), True, fg_color, self.bg_color)
+            # A game without a surface keeps the score but has nothing to draw on.
+            if self.surface is None:
+                return
+            # the score only changes once a second, so skip the redraw otherwise
+            if self.score[0] == self.drawn_score:
+                return
+            # get the text box for the score, it is rendered once per value
+            text_box = self.score_text.render(self.score[0])
             surface_height = self.surface.get_width()
             text_box_height = text_box.get_width()
             location = (surface_height - text_box_height, 0)
-            self.surface.blit(text_box, location)
+            # clear the old score first, it may have been wider than the new one
+            if self.score_rect is not None:
+                self.surface.fill(self.bg_color, self.score_rect)
+                self.dirty_rects.add(self.score_rect)
+            self.score_rect = self.surface.blit(text_box, location)
+            self.dirty_rects.add(self.score_rect)
+            self.drawn_score = self.score[0]
       
             #pygame.display.flip() # make the updated surface appear on the display
         
 
+    def tile_at(self, mousePosition): # this method returns the tile under a position, or None
+        # the tiles sit on a regular grid, so the row and column come straight from the position
+        column = int(mousePosition[0] // self.tile_width)
+        row = int(mousePosition[1] // self.tile_height)
+        if 0 <= row < self.rows and 0 <= column < self.columns:
+            return self.board[row][column]
+        return None
+
     def handle_mouse_up(self, mousePosition): # if the mouse button up is pressed we carry out the following method
 
-        for row in self.board:
-            for tile in row:
-                # if a tile is selected then True will be returned if it is not exposed
-                # else if it already is then False is returned
-                if tile.select(mousePosition):
-                    # if True and self.turn is an integer
-                    if type(self.turn) == int:
-                        # also, if self.turn <= 2
-                        if self.turn <= 2:
-                            # let us first add 1 to self.turn
-                            self.turn += 1
-                            # if self.turn == 1 it means it is first click
-                            if self.turn == 1:
-                                # first draw the tile
-                                tile.draw_card()
-                                # also using str_name() method we add its image name to self.turn_str1
-                                self.turn_str1 += tile.str_name()
-                                # finally, also assign tile1 to this tile
-                                self.tile1 = tile
-                            # if self.turn ==2 it means it is second click
-                            elif self.turn == 2:
-                                # we carry same procedure as above
-                                tile.draw_card()
-                                self.turn_str2 += tile.str_name()
-                                self.tile2 = tile
-                                self.timing = pygame.time.get_ticks() + 1000
-                                # we also make self.turn a None object
-                                self.turn = None                
-
-        pygame.display.update()    
+        tile = self.tile_at(mousePosition)
+        # if a tile is selected then True will be returned if it is not exposed
+        # else if it already is then False is returned
+        if tile is not None and tile.select(mousePosition):
+            self.reveal(tile)
+
+    def reveal(self, tile): # this method exposes a covered tile as the next click of the turn
+        state = self.state
+        # if state.turn == 0 it means it is first click
+        if state.turn == 0:
+            # first draw the tile
+            tile.draw_card()
+            # then remember which tile it was and move on to the second click
+            state.first = tile.index
+            state.turn = 1
+        # if state.turn == 1 it means it is second click
+        elif state.turn == 1:
+            # we carry same procedure as above
+            tile.draw_card()
+            state.second = tile.index
+            state.timing = self.ticks() + 1000
+            # the event driven game gets a TURN_EVENT when that second is over
+            if self.event_driven:
+                pygame.time.set_timer(TURN_EVENT, 1000, 1)
+            # state.turn == 2 means both tiles are shown and clicks are ignored until the second is over
+            state.turn = 2
 
     def update(self):
         # Update the game objects for the next frame.
         # - self is the Game to update
-        # first let us get the current time using get_ticks()
-        current_time = pygame.time.get_ticks()
+        # first let us get the current time using ticks()
+        current_time = self.ticks()
 
-        # to ensure we only have turns, let us make sure self.turn is equal to None
-        if self.turn == None:
-            # moreover, if the current time is greater than or equal to self.timing
+        # to ensure we only have turns, let us make sure both tiles of the turn are shown
+        if self.state.turn == 2:
+            # moreover, if the current time is greater than or equal to the turn's timing
             # which ensures 1 second have passed
-            if current_time >= self.timing:
-                # now, if the image names for both images are equal we keep them uncovered
-                if self.turn_str1 == self.turn_str2:
-                    # add 2 to tile count
-                    self.tilecount += 2
-                    # restart the whole process
-                    self.turn_str1 = ""
-                    self.turn_str2 = ""
-                    self.tile1 = None
-                    self.tile2 = None
-                    self.turn = 0
-
-                # however if the names are not equal we cover them using their methods
-                elif self.turn_str1 != self.turn_str2:
-                    # hide both the cards
-                    self.tile1.hide_card()
-                    self.tile2.hide_card()
-                    # restart the whole process
-                    self.turn_str1 = ""
-                    self.turn_str2 = ""
-                    self.tile1 = None
-                    self.tile2 = None
-                    self.turn = 0
-
-        pygame.display.update()
+            if current_time >= self.state.timing:
+                self.end_turn()
+
+    def end_turn(self): # this method finishes a turn once both tiles were shown for a second
+        state = self.state
+        # now, if the image ids for both tiles are equal we keep them uncovered
+        if state.images[state.first] == state.images[state.second]:
+            # add 2 to tile count
+            state.tilecount += 2
+        # however if the ids are not equal we cover them using their methods
+        else:
+            self.tiles[state.first].hide_card()
+            self.tiles[state.second].hide_card()
+        # restart the whole process
+        state.first = -1
+        state.second = -1
+        state.turn = 0
 
     def decide_continue(self):
         # Check and remember if the game should continue
-        # Here, if total tiles uncovered is 16 we stop the game
-        if self.tilecount == 16:
+        # Here, if every tile on the board is uncovered we stop the game
+        if self.state.tilecount == self.tiletotal:
             self.continue_game = False
+            # the score stops, so its timer can stop too
+            if self.event_driven:
+                pygame.time.set_timer(SCORE_EVENT, 0)
+
+
+class MemoryState: # this is the memory state class
+    # An object in this class holds everything that changes during a game in a
+    # few slots, so copying it for every frame is cheap.
+
+    __slots__ = ('images', 'covered', 'tilecount', 'turn', 'first', 'second', 'timing')
+
+    def __init__(self, images=None, tiletotal=0):
+        # Initialize a MemoryState.
+        # - self is the MemoryState to initialize
+        # - images is the array of image ids of the tiles in row order, it never
+        #   changes during a game so every copy shares it
+        # - tiletotal is the number of tiles, they all start covered
+        self.images = images
+        # bit i is set while tile i is covered
+        self.covered = (1 << tiletotal) - 1
+        # the number of exposed tiles that were matched
+        self.tilecount = 0
+        # 0 before the first click of a turn, 1 before the second and 2 while both are shown
+        self.turn = 0
+        # the tile indexes of the first and second click, -1 when not clicked yet
+        self.first = -1
+        self.second = -1
+        # the time in ticks() when both tiles of the turn have been shown long enough
+        self.timing = 0
+
+    def copy_from(self, other): # this method makes this state the same as other
+        self.images = other.images
+        self.covered = other.covered
+        self.tilecount = other.tilecount
+        self.turn = other.turn
+        self.first = other.first
+        self.second = other.second
+        self.timing = other.timing
+
+    def same_as(self, other): # this method returns True if both states are the same
+        return (self.covered == other.covered and self.turn == other.turn and self.first == other.first
+                and self.second == other.second and self.tilecount == other.tilecount and self.images is other.images)
+
+
+class DirtyRects: # this is the dirty rectangles class
+    # An object in this class collects the parts of the window that changed
+    # during a frame so they can be sent to the display in one call.
+
+    def __init__(self):
+        # Initialize a DirtyRects.
+        # - self is the DirtyRects to initialize
+        self.rects = []
+
+    def add(self, rect): # this method remembers a rectangle that changed
+        self.rects.append(pygame.Rect(rect))
+
+    def update(self): # this method pushes the changed rectangles to the display
+        # nothing changed this frame, so there is nothing to send
+        if not self.rects:
+            return False
+        pygame.display.update(self.rects)
+        self.rects = []
+        return True
+
+
+class ImageCache: # this is the image cache class
+    # An object in this class decodes each tile image once and hands the
+    # same surface to every Tile that shows it.
+
+    def __init__(self, max_images=64, theme=None, loader=None):
+        # Initialize an ImageCache.
+        # - self is the ImageCache to initialize
+        # - max_images is how many surfaces are kept before the least
+        #   recently used one is dropped
+        # - theme is the theme the images are decoded from, the game's own pictures by default
+        # - loader is the ImageLoader that decodes them in the background, or
+        #   None to decode them here when they are first asked for
+        self.max_images = max_images
+        self.theme = theme if theme is not None else open_theme()
+        self.loader = loader
+        # the surfaces are kept in use order, the oldest one first
+        self.surfaces = collections.OrderedDict()
+        # these count how often a surface was found in or missing from the cache
+        self.hits = 0
+        self.misses = 0
+        # the stand-in surfaces for images that are not decoded yet, one per size
+        self.placeholders = {}
+
+    def get(self, filename, max_size=None): # this method returns the surface for an image file
+        # - max_size is an optional (width, height) that the image is shrunk to fit in,
+        #   small tiles on big boards need this
+        key = (filename, max_size)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            # found it, so mark it as the most recently used surface
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        if max_size is None:
+            # not cached yet, so decode it, or take it from the loader, and convert
+            # it to the display pixel format once here instead of on every blit
+            if self.loader is None:
+                surface = self.theme.load(filename)
+            else:
+                surface = self.loader.take(filename)
+                if surface is None:
+                    # not decoded yet, a placeholder stands in until it is
+                    return self.placeholder(max_size)
+            if pygame.display.get_surface() is not None:
+                surface = surface.convert()
+        else:
+            # shrink the full size image, but only if it does not fit already
+            surface = self.get(filename)
+            if surface is self.placeholder(None):
+                return self.placeholder(max_size)
+            width = min(surface.get_width(), max_size[0])
+            height = min(surface.get_height(), max_size[1])
+            if (width, height) != surface.get_size():
+                surface = pygame.transform.smoothscale(surface, (width, height))
+        self.misses += 1
+        self.surfaces[key] = surface
+        # drop the least recently used surface when we hold too many
+        if len(self.surfaces) > self.max_images:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def placeholder(self, size): # this method returns a plain surface of the given size to show for now
+        surface = self.placeholders.get(size)
+        if surface is None:
+            surface = pygame.Surface(size or PLACEHOLDER_SIZE)
+            surface.fill(PLACEHOLDER_COLOR)
+            self.placeholders[size] = surface
+        return surface
+
+    def clear(self): # this method forgets every cached surface
+        self.surfaces.clear()
 
 
 class Tile: # this is the tile class
 
-    def __init__(self, tilePosition, image0, image, surface):
+    __slots__ = ('x', 'y', 'width', 'height', 'image0', 'image', 'surface', 'image_cache', 'dirty_rects',
+                 'state', 'index', 'rect', 'color')
+
+    def __init__(self, tilePosition, image0, image, surface, image_cache, dirty_rects, state, index):
 
         # left self.x and self.y be the centers of the Tile
         self.x = tilePosition[0]
@@ -238,32 +688,56 @@ class Tile: # this is the tile class
         self.image = image
         # game surface
         self.surface = surface
+        # the shared cache that the tile gets its image surfaces from
+        self.image_cache = image_cache
+        # the collector that the tile reports its rectangle to when it changes
+        self.dirty_rects = dirty_rects
         # create the Tile as a rectangle  
         self.rect = pygame.Rect(self.x, self.y, self.width, self.height)
         # The below is a color for the tile border
         self.color = pygame.Color("black")
-        # initially tile is covered, so it is True
-        self.covered = True
+        # whether the tile is covered is kept as bit index of the game state's covered mask
+        self.state = state
+        self.index = index
       
+    @property
+    def covered(self): # True while the tile shows its cover
+        return bool(self.state.covered >> self.index & 1)
+
+    @covered.setter
+    def covered(self, covered):
+        if covered:
+            self.state.covered |= 1 << self.index
+        else:
+            self.state.covered &= ~(1 << self.index)
+
     def str_name(self): # this method returns image name of a tile
         return self.image
 
-    def draw_card(self): # this method draws the tile
-        # first load the image, then draw it and blit the image at the position
-        # of the rectangle. We also have a border of width 6 which is black in color
-        theimage = pygame.image.load(self.image)
-        pygame.draw.rect(self.surface,self.color,self.rect,6)
-        self.surface.blit(theimage,self.rect)
+    def draw_card(self): # this method exposes the tile
         # since the tile is exposed, self.covered == False
         self.covered = False
+        self.draw()
 
     def hide_card(self): # this method reverses tile to original state, ie covered
-        # first load the image an draw, blit it in rectangles position
-        notimage = pygame.image.load(self.image0)
-        pygame.draw.rect(self.surface,self.color,self.rect,6)
-        self.surface.blit(notimage,self.rect)       
         # since it is now covered, self.covered == True
         self.covered = True
+        self.draw()
+
+    def draw(self): # this method draws the tile
+        if self.surface is None:
+            return
+        # first get the cover or the picture from the cache, then draw it and blit the image
+        # at the position of the rectangle. We also have a border of width 6 which is black in color
+        size = (int(self.width), int(self.height))
+        if self.covered:
+            theimage = self.image_cache.get(self.image0, size)
+        else:
+            theimage = self.image_cache.get(self.image, size)
+        pygame.draw.rect(self.surface,self.color,self.rect,6)
+        self.surface.blit(theimage,self.rect)
+        # the tile changed, so its rectangle must be sent to the display
+        self.dirty_rects.add(self.rect)
       
     def select(self, mousePosition): # this method will decide if a tile is already exposed or not
         # assign a boolean False to valid_click
@@ -287,4 +761,5 @@ class Tile: # this is the tile class
    
         return valid_click
 
-main()
+if __name__ == '__main__':
+    main()
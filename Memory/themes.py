@@ -0,0 +1,194 @@
+import pygame, os, io, sys, json, mmap, queue, struct, threading, zipfile, zlib
+
+
+# the tile images that come with the game, kept next to this file
+DEFAULT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_COVER = "image0.bmp"
+DEFAULT_IMAGES = ["image1.bmp", "image2.bmp", "image3.bmp", "image4.bmp", "image5.bmp", "image6.bmp", "image7.bmp", "image8.bmp"]
+
+# every theme pack holds this file, e.g.
+# {"name": "Animals", "cover": "cover.png", "images": ["cat.png", "dog.png", ...]}
+MANIFEST = "manifest.json"
+
+# images that are compressed already are stored in a pack as they are
+STORED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+
+# the fixed part of a zip member's local header, its name and extra field follow it
+LOCAL_HEADER = struct.Struct('<4s22xHH')
+
+
+class DirectoryTheme: # this is the directory theme class
+    # An object in this class reads a theme's images from files in a folder.
+    # The images that come with the game are one.
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, cover=DEFAULT_COVER, images=DEFAULT_IMAGES, name='classic'):
+        # Initialize a DirectoryTheme.
+        # - self is the DirectoryTheme to initialize
+        # - directory is the folder the images are in
+        # - cover is the file name of the image on the back of every tile
+        # - images are the file names of the pictures to find pairs of
+        self.directory = directory
+        self.cover = cover
+        self.images = list(images)
+        self.name = name
+
+    def load(self, filename): # this method decodes one image and returns its surface
+        return pygame.image.load(os.path.join(self.directory, filename))
+
+    def close(self):
+        pass
+
+
+class ThemePack: # this is the theme pack class
+    # An object in this class reads a theme from a zip archive with a manifest.
+    # The archive is memory mapped. Opening it reads only the zip directory and
+    # the manifest, and each image is sliced out of the mapping when it is
+    # decoded, which any thread can do without a lock.
+
+    def __init__(self, path):
+        # Initialize a ThemePack.
+        # - self is the ThemePack to initialize
+        # - path is the zip archive of the theme
+        self.path = path
+        with open(path, 'rb') as pack_file:
+            # (method, size) and where the data starts come from the zip directory
+            with zipfile.ZipFile(pack_file) as archive:
+                self.members = {info.filename: info for info in archive.infolist()}
+            self.mapping = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if MANIFEST not in self.members:
+            self.close()
+            raise ValueError('%s has no %s' % (path, MANIFEST))
+        try:
+            manifest = json.loads(self.read(MANIFEST).decode('utf-8'))
+            self.name = manifest.get('name', os.path.splitext(os.path.basename(path))[0])
+            self.cover = manifest['cover']
+            self.images = list(manifest['images'])
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            # not JSON, not an object, or without a cover or images
+            self.close()
+            raise ValueError('%s has a bad %s: %r' % (path, MANIFEST, error)) from error
+        if not self.images:
+            self.close()
+            raise ValueError('%s has no images' % path)
+        # a name the archive doesn't hold would only fail when its tile is drawn
+        missing = [name for name in [self.cover] + self.images if name not in self.members]
+        if missing:
+            self.close()
+            raise ValueError('%s is missing %s, which its %s names' % (path, ', '.join(missing), MANIFEST))
+
+    def read(self, filename): # this method returns the bytes of one member of the archive
+        info = self.members[filename]
+        signature, name_length, extra_length = LOCAL_HEADER.unpack_from(self.mapping, info.header_offset)
+        if signature != b'PK\x03\x04':
+            raise ValueError('%s: bad zip header for %s' % (self.path, filename))
+        start = info.header_offset + LOCAL_HEADER.size + name_length + extra_length
+        data = self.mapping[start:start + info.compress_size]
+        if info.compress_type == zipfile.ZIP_STORED:
+            return data
+        if info.compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+        raise ValueError('%s: %s uses an unsupported compression' % (self.path, filename))
+
+    def load(self, filename): # this method decodes one image and returns its surface
+        # the name hint tells pygame the file format
+        return pygame.image.load(io.BytesIO(self.read(filename)), filename)
+
+    def close(self):
+        self.mapping.close()
+
+
+def open_theme(path=None): # this function returns the theme at path, or the game's own images for None
+    if path is None:
+        return DirectoryTheme()
+    return ThemePack(path)
+
+
+def make_pack(path, cover, images, name=None): # this function writes a theme pack from image files
+    # - path is the zip archive to write
+    # - cover is the image file for the back of the tiles
+    # - images are the image files of the pictures
+    # - name is the theme's name, by default the archive's name
+    manifest = {
+        'name': name or os.path.splitext(os.path.basename(path))[0],
+        'cover': os.path.basename(cover),
+        'images': [os.path.basename(image) for image in images],
+    }
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr(MANIFEST, json.dumps(manifest, indent=2))
+        for filename in [cover] + list(images):
+            stored = filename.lower().endswith(STORED_EXTENSIONS)
+            archive.write(filename, os.path.basename(filename), zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+
+
+class ImageLoader: # this is the image loader class
+    # An object in this class decodes a theme's images on a thread of its own,
+    # in the order they were asked for, so the game never waits for the disk.
+    # It posts an event when each image is ready.
+
+    def __init__(self, theme, event_type=None):
+        # Initialize an ImageLoader and start its thread.
+        # - self is the ImageLoader to initialize
+        # - theme is the theme to decode the images of
+        # - event_type is the pygame event type posted with the image's name
+        #   when it is ready, or None to post nothing
+        self.theme = theme
+        self.event_type = event_type
+        self.requests = queue.Queue()
+        # the names that were asked for, and the decoded surface, or the
+        # exception decoding raised, for every name that is done and not taken yet
+        self.requested = set()
+        self.decoded = {}
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name='memory-image-loader', daemon=True)
+        self.thread.start()
+
+    def request(self, filenames): # this method asks for images to be decoded, if they weren't already
+        for filename in filenames:
+            if filename not in self.requested:
+                self.requested.add(filename)
+                self.requests.put(filename)
+
+    def take(self, filename): # this method hands over the decoded surface, or returns None if it isn't ready yet
+        # The loader lets go of what it hands over, so the ImageCache is the only
+        # owner and its limit holds. An image the cache dropped is decoded again.
+        result = self.decoded.pop(filename, None)
+        if isinstance(result, Exception):
+            raise result
+        if result is None:
+            self.request((filename,))
+        else:
+            self.requested.discard(filename)
+        return result
+
+    def run(self): # this method is the thread, it decodes until close() is called
+        while True:
+            filename = self.requests.get()
+            if self.closed:
+                return
+            try:
+                self.decoded[filename] = self.theme.load(filename)
+            except Exception as error:
+                # the error is raised in the main thread, when the image is taken
+                self.decoded[filename] = error
+            if self.event_type is not None and pygame.display.get_init():
+                pygame.event.post(pygame.event.Event(self.event_type, image=filename))
+
+    def close(self): # this method stops the thread, images still waiting are not decoded
+        self.closed = True
+        self.requests.put(None)
+        self.thread.join()
+
+
+def main(argv=None):
+    # write a theme pack: python -m Memory.themes PACK.zip COVER IMAGE...
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 3:
+        print('usage: python -m Memory.themes PACK.zip COVER IMAGE...')
+        return 2
+    make_pack(argv[0], argv[1], argv[2:])
+    print('wrote %s with %d images' % (argv[0], len(argv) - 2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
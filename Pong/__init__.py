@@ -0,0 +1,2 @@
+# The two player Pong game.
+from .pong import main, replay, Game, Ball, Paddle, KeyboardController, WINDOW_SIZE, WORLD_SIZE
@@ -0,0 +1,3 @@
+from .pong import main
+
+main()
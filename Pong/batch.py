@@ -0,0 +1,254 @@
+import time, sys
+
+import numpy as np
+
+from .pong import Game, Paddle, WORLD_SIZE
+from .headless import IdleController, DIFFICULTIES, meeting_y
+
+
+# Policies move the paddles of every match at once. A policy is called with
+# the BatchEngine and the paddle index (0 for A, 1 for B) and returns an
+# int array with -1 for up, 1 for down or 0 to stay, one entry per match.
+
+def idle_policy(engine, paddle):
+    return np.zeros(engine.count, dtype=np.int64)
+
+
+def tracking_policy(engine, paddle):
+    # keep the middle of the paddle level with the ball, like TrackingController
+    middle = engine.paddle_tops[:, paddle] + engine.paddle_height / 2
+    ball_y = engine.centers[:, 1]
+    return (ball_y > middle + engine.paddle_speed).astype(np.int64) - (ball_y < middle - engine.paddle_speed)
+
+
+def random_policy(engine, paddle):
+    return engine.rng.integers(-1, 2, engine.count)
+
+
+class PredictingPolicy: # PredictingPolicy class
+    # An object in this class plays like a PredictingController in every
+    # match at once. It keeps a target per match, so each paddle needs an
+    # object of its own.
+
+    def __init__(self, difficulty='medium', seed=None):
+        # Initialize a PredictingPolicy.
+        # - self is the PredictingPolicy to initialize
+        # - difficulty is one of the DIFFICULTIES in headless.py
+        # - seed seeds the misjudgements
+        self.reaction_ms, self.error = DIFFICULTIES[difficulty]
+        self.rng = np.random.default_rng(seed)
+        # the arrays are made on the first call, once the number of matches is known
+        self.velocities = None
+
+    def start(self, engine):
+        count = engine.count
+        self.velocities = np.full((count, 2), np.nan)
+        self.targets = np.full(count, WORLD_SIZE[1] / 2)
+        self.next_targets = self.targets.copy()
+        self.react_steps = np.zeros(count, dtype=np.int64)
+        self.misses = np.zeros(count)
+        self.reaction_steps = round(self.reaction_ms / engine.step_ms)
+        self.step = 0
+
+    def predict(self, engine, which):
+        # Return the target of the chosen matches, see PredictingController.predict.
+        x = engine.centers[which, 0]
+        y = engine.centers[which, 1]
+        velocity_x = engine.velocities[which, 0]
+        target_x = np.where(velocity_x < 0, engine.paddle_lefts[0] + engine.paddle_width + engine.ball_radius,
+                            engine.paddle_lefts[1] - engine.ball_radius)
+        meeting = meeting_y(x, y, velocity_x, engine.velocities[which, 1], target_x, engine.low, engine.high[1])
+        stuck = (y < 0) | (y > WORLD_SIZE[1])
+        return np.where(stuck, y, meeting) + self.misses[which]
+
+    def __call__(self, engine, paddle):
+        if self.velocities is None:
+            self.start(engine)
+        # work out the targets again only where the velocity changed
+        velocities = engine.velocities
+        new_shot = velocities[:, 0] != self.velocities[:, 0]
+        changed = new_shot | (velocities[:, 1] != self.velocities[:, 1])
+        if changed.any():
+            self.misses[new_shot] = self.rng.uniform(-self.error, self.error, np.count_nonzero(new_shot))
+            self.next_targets[changed] = self.predict(engine, changed)
+            self.react_steps[new_shot] = self.step + self.reaction_steps
+            self.velocities[changed] = velocities[changed]
+        ready = self.react_steps <= self.step
+        self.targets[ready] = self.next_targets[ready]
+        self.step += 1
+
+        middle = engine.paddle_tops[:, paddle] + engine.paddle_height / 2
+        targets = self.targets
+        return (targets > middle + engine.paddle_speed).astype(np.int64) - (targets < middle - engine.paddle_speed)
+
+
+class BatchEngine: # BatchEngine class
+    # An object in this class plays many Pong matches side by side. The balls,
+    # paddles and scores of every match live in NumPy arrays, and one step()
+    # moves all of them with the same rules as Game.update
+
+    def __init__(self, count, policyA=tracking_policy, policyB=random_policy, seed=None):
+        # Initialize a BatchEngine.
+        # - self is the BatchEngine to initialize
+        # - count is the number of matches to play at once
+        # - policyA and policyB move the paddles, see the policies above
+        # - seed seeds the random numbers for the ball starts and bounces
+        self.count = count
+        self.policyA = policyA
+        self.policyB = policyB
+        self.rng = np.random.default_rng(seed)
+
+        # take the field layout from a windowless Game so both stay the same
+        game = Game(None, IdleController(), IdleController())
+        self.ball_radius = game.ball_radius
+        self.paddle_speed = game.paddle_speed
+        self.step_ms = game.step_ms
+        self.paddle_lefts = np.array([game.paddle1left, game.paddle2left])
+        self.paddle_width = game.paddle1width
+        self.paddle_height = game.paddle1height
+        # the ball bounces when its center reaches these, see Ball.update
+        self.low = self.ball_radius
+        self.high = np.array(WORLD_SIZE) - self.ball_radius
+        # the lowest top a paddle can have, see Paddle.moveDown
+        self.lowest_top = WORLD_SIZE[1] - game.paddle1height
+        self.winning_score = 11
+
+        # one row per match: ball center and velocity, both paddle tops and both scores
+        self.centers = self.rng.integers(180, 221, (count, 2)).astype(np.float64)
+        self.velocities = np.tile(np.array(game.ball_velocity, dtype=np.float64), (count, 1))
+        self.paddle_tops = np.full((count, 2), [game.paddle1top, game.paddle2top], dtype=np.float64)
+        self.scores = np.zeros((count, 2), dtype=np.int64)
+        # matches that nobody has won yet
+        self.active = np.ones(count, dtype=bool)
+        # these keep count of the work done
+        self.steps = 0
+        self.seconds = 0.0
+
+    def step(self):
+        # Move every unfinished match on by one frame.
+        # - self is the BatchEngine
+        active = self.active
+        centers = self.centers
+        velocities = self.velocities
+
+        # move the balls and bounce them off the edges of the window
+        starts = centers.copy()
+        centers[active] += velocities[active]
+        bounce = active[:, None] & ((centers >= self.high) | (centers <= self.low))
+        velocities[bounce] = -velocities[bounce]
+
+        # move the paddles, with the same limits as Paddle.moveUp and moveDown
+        for paddle, policy in ((0, self.policyA), (1, self.policyB)):
+            direction = np.asarray(policy(self, paddle))
+            tops = self.paddle_tops[:, paddle]
+            up = active & (direction < 0)
+            down = active & (direction > 0)
+            tops[up] -= self.paddle_speed
+            tops[up & (tops < 10)] = 0
+            tops[down] += self.paddle_speed
+            tops[down & (tops > self.lowest_top)] = self.lowest_top
+
+        # bounce the balls off the paddles, paddle A is checked for balls moving
+        # left and paddle B for balls moving right, sweeping each ball's path
+        # like Game.bounce does
+        motion = centers - starts
+        for paddle, side in ((0, -1), (1, 1)):
+            moving = active & (np.sign(motion[:, 0]) == side)
+            t = self.sweep(paddle, starts, motion)
+            hit = moving & (t <= 1)
+            touch_x = starts[hit, 0] + motion[hit, 0] * t[hit]
+            centers[hit, 0] = touch_x - motion[hit, 0] * (1 - t[hit])
+            velocities[hit, 0] = -side * np.abs(velocities[hit, 0])
+            velocities[hit, 1] = -self.rng.integers(-2, 4, np.count_nonzero(hit))
+
+        # score the balls that reached either end of the window
+        self.scores[active & (centers[:, 0] >= WORLD_SIZE[0] - self.ball_radius), 0] += 1
+        self.scores[active & (centers[:, 0] <= self.low), 1] += 1
+        self.active &= (self.scores < self.winning_score).all(axis=1)
+
+    def sweep(self, paddle, starts, motion):
+        # Return, for every match, how far along its path (0 to 1) the ball
+        # first touches the given paddle, or infinity where it misses.
+        # - self is the BatchEngine
+        # - paddle is 0 for paddle A and 1 for paddle B
+        # - starts and motion are the ball centers before the step and how far they moved
+        left = self.paddle_lefts[paddle] - self.ball_radius
+        top = self.paddle_tops[:, paddle] - self.ball_radius
+        lows = np.stack([np.full(self.count, left), top], axis=1)
+        highs = lows + [self.paddle_width + 2 * self.ball_radius, self.paddle_height + 2 * self.ball_radius]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_low = (lows - starts) / motion
+            t_high = (highs - starts) / motion
+        # an axis the ball doesn't move along is either always between the sides,
+        # which doesn't limit the path, or never, which is a miss: entering at
+        # infinity puts t_enter past t_exit whatever the other axis says
+        still = motion == 0
+        between = (starts >= lows) & (starts <= highs)
+        t_low[still] = np.where(between[still], -np.inf, np.inf)
+        t_high[still] = np.inf
+        t_enter = np.maximum(np.minimum(t_low, t_high).max(axis=1), 0.0)
+        t_exit = np.minimum(np.maximum(t_low, t_high).min(axis=1), 1.0)
+        return np.where(t_enter <= t_exit, t_enter, np.inf)
+
+    def run(self, max_steps=100000):
+        # Step until every match is won or max_steps have passed, return the scores.
+        # - self is the BatchEngine
+        start = time.perf_counter()
+        steps = 0
+        while self.active.any() and steps < max_steps:
+            self.step()
+            steps += 1
+        self.seconds += time.perf_counter() - start
+        self.steps += steps
+        return self.scores
+
+    def match_steps_per_second(self):
+        # Return how many single-match steps per second were simulated.
+        if self.seconds == 0:
+            return 0.0
+        return self.steps * self.count / self.seconds
+
+
+def sweep_mismatches(count=100000, seed=0):
+    # Return the (start, motion, paddle top) cases in which BatchEngine.sweep
+    # and Paddle.sweep disagree, out of count random ones near paddle A. A
+    # third of the motions are flat along one axis, the case that is easiest
+    # to get wrong.
+    rng = np.random.default_rng(seed)
+    engine = BatchEngine(count, seed=seed)
+    engine.paddle_tops[:, 0] = rng.uniform(0, WORLD_SIZE[1] - engine.paddle_height, count)
+    starts = rng.uniform([60, 100], [160, 300], (count, 2))
+    motion = rng.integers(-12, 13, (count, 2)).astype(np.float64)
+    motion[rng.integers(0, 3, count) == 0, rng.integers(0, 2)] = 0
+    batch = engine.sweep(0, starts, motion)
+    mismatches = []
+    for i in range(count):
+        paddle = Paddle(None, engine.paddle_lefts[0], engine.paddle_tops[i, 0], engine.paddle_width, engine.paddle_height)
+        t = paddle.sweep(starts[i], starts[i] + motion[i], engine.ball_radius)
+        if t is None:
+            t = np.inf
+        if not np.isclose(t, batch[i]) and t != batch[i]:
+            mismatches.append((tuple(starts[i]), tuple(motion[i]), paddle.top))
+    return mismatches
+
+
+def main(): # main function
+    # play the number of matches given on the command line, 10000 by default,
+    # or check the vectorized paddle sweep against Paddle.sweep with 'check'
+    if len(sys.argv) > 1 and sys.argv[1] == 'check':
+        mismatches = sweep_mismatches()
+        print('%d sweeps disagree with Paddle.sweep' % len(mismatches))
+        for case in mismatches[:10]:
+            print('start %s, motion %s, paddle top %.1f' % case)
+        return
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    engine = BatchEngine(count)
+    scores = engine.run()
+    winsA = np.count_nonzero(scores[:, 0] > scores[:, 1])
+    winsB = np.count_nonzero(scores[:, 1] > scores[:, 0])
+    print('%d matches, player A won %d, player B won %d' % (count, winsA, winsB))
+    print('%d steps in %.2f s, %.0f match steps per second' % (engine.steps, engine.seconds, engine.match_steps_per_second()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+import random, time, sys
+
+from .pong import Game, WORLD_SIZE
+
+
+# Controllers for games without a keyboard. Like the KeyboardController in
+# pong.py, each one answers -1 for up, 1 for down or 0 to stay.
+
+class IdleController: # IdleController class
+    # An object in this class never moves its paddle
+
+    def direction(self, game, paddle):
+        return 0
+
+
+class TrackingController: # TrackingController class
+    # An object in this class keeps the middle of its paddle level with the ball
+
+    def direction(self, game, paddle):
+        middle = paddle.top + paddle.height / 2
+        if game.ball.center[1] < middle - game.paddle_speed:
+            return -1
+        if game.ball.center[1] > middle + game.paddle_speed:
+            return 1
+        return 0
+
+
+class RandomController: # RandomController class
+    # An object in this class moves its paddle at random
+
+    def __init__(self, rng=None):
+        # Initialize a RandomController.
+        # - self is the RandomController to initialize
+        # - rng is the random.Random to draw moves from
+        self.rng = rng if rng is not None else random.Random()
+
+    def direction(self, game, paddle):
+        return self.rng.randint(-1, 1)
+
+
+# How the PredictingController plays at each difficulty: how many
+# milliseconds it takes to react to a new shot, and by up to how many pixels
+# it misjudges where the shot goes
+DIFFICULTIES = {
+    'easy': (350, 45),
+    'medium': (180, 20),
+    'hard': (70, 6),
+    'perfect': (0, 0),
+}
+
+
+def fold(y, low, high):
+    # Return where a ball that bounces between low and high is when it would
+    # be at y without the walls. Works on numbers and on NumPy arrays.
+    span = high - low
+    offset = (y - low) % (2 * span)
+    return low + span - abs(offset - span)
+
+
+def meeting_y(x, y, velocity_x, velocity_y, target_x, low, high):
+    # Return the height at which a ball at (x, y) with the given velocity
+    # reaches target_x, bouncing off walls at low and high on the way.
+    # The time to get there is worked out in one go instead of step by step,
+    # so the ball must be moving towards target_x. Works on NumPy arrays too.
+    steps = (target_x - x) / velocity_x
+    return fold(y + velocity_y * steps, low, high)
+
+
+class PredictingController: # PredictingController class
+    # An object in this class works out where the ball will reach its paddle
+    # and moves there. The target is only worked out again when the ball's
+    # velocity changes, so most steps cost a comparison or two.
+
+    def __init__(self, difficulty='medium', rng=None):
+        # Initialize a PredictingController.
+        # - self is the PredictingController to initialize
+        # - difficulty is one of the DIFFICULTIES
+        # - rng is the random.Random the misjudgements are drawn from
+        self.reaction_ms, self.error = DIFFICULTIES[difficulty]
+        self.rng = rng if rng is not None else random.Random()
+        # the velocity the target was worked out for
+        self.velocity = (None, None)
+        # the height the paddle heads for, the one it will head for once it
+        # has reacted, the step it reacts at and how far it misjudges the shot
+        self.target = WORLD_SIZE[1] / 2
+        self.next_target = None
+        self.react_step = 0
+        self.miss = 0.0
+
+    def predict(self, game, paddle):
+        # Return the height the ball will reach the paddle at. While the ball
+        # goes away, return where it will reach the other paddle instead, the
+        # shot back can't be known yet but starts from there.
+        velocity_x, velocity_y = game.ball_velocity
+        x, y = game.ball_center
+        low = game.ball_radius
+        high = WORLD_SIZE[1] - game.ball_radius
+        if y < 0 or y > WORLD_SIZE[1]:
+            # a paddle can push the ball out past a wall, where it only shakes back and forth
+            return y + self.miss
+        # the left paddle is reached at its right side, by a ball moving left
+        if velocity_x < 0:
+            target_x = game.paddleA.left + game.paddleA.width + game.ball_radius
+        else:
+            target_x = game.paddleB.left - game.ball_radius
+        return meeting_y(x, y, velocity_x, velocity_y, target_x, low, high) + self.miss
+
+    def direction(self, game, paddle):
+        velocity = game.ball_velocity
+        if velocity[0] != self.velocity[0] or velocity[1] != self.velocity[1]:
+            if velocity[0] != self.velocity[0]:
+                # a new shot, it takes the reaction time to see where it goes
+                self.miss = self.rng.uniform(-self.error, self.error)
+                self.next_target = self.predict(game, paddle)
+                self.react_step = game.steps + round(self.reaction_ms / game.step_ms)
+            elif self.next_target is None:
+                # a wall bounce keeps the same shot, so the target is only corrected
+                self.target = self.predict(game, paddle)
+            else:
+                self.next_target = self.predict(game, paddle)
+            self.velocity = (velocity[0], velocity[1])
+        if self.next_target is not None and game.steps >= self.react_step:
+            self.target = self.next_target
+            self.next_target = None
+
+        middle = paddle.top + paddle.height / 2
+        if self.target < middle - game.paddle_speed:
+            return -1
+        if self.target > middle + game.paddle_speed:
+            return 1
+        return 0
+
+
+class Engine: # Engine class
+    # An object in this class plays Pong matches without a window or a clock,
+    # stepping the physics and scoring of Game.update as fast as it can
+
+    def __init__(self, controllerA=None, controllerB=None, max_steps=100000, seed=None):
+        # Initialize an Engine.
+        # - self is the Engine to initialize
+        # - controllerA and controllerB move the paddles, by default a
+        #   TrackingController against a RandomController
+        # - max_steps ends a match that nobody wins, e.g. two perfect players
+        # - seed seeds every match's game, so the same seed plays the same matches
+        self.controllerA = controllerA if controllerA is not None else TrackingController()
+        self.controllerB = controllerB if controllerB is not None else RandomController()
+        self.max_steps = max_steps
+        self.rng = random.Random(seed)
+        # these keep count of the work done over every match played
+        self.steps = 0
+        self.seconds = 0.0
+
+    def play_match(self):
+        # Play one match to the end and return (scoreA, scoreB, steps).
+        # - self is the Engine
+        game = Game(None, self.controllerA, self.controllerB, seed=self.rng.getrandbits(64))
+        steps = 0
+        start = time.perf_counter()
+        while game.continue_game and steps < self.max_steps:
+            game.update()
+            game.decide_continue()
+            steps += 1
+        self.seconds += time.perf_counter() - start
+        self.steps += steps
+        return game.scoreA, game.scoreB, steps
+
+    def play_matches(self, count):
+        # Play count matches and return the list of their results.
+        return [self.play_match() for match in range(count)]
+
+    def steps_per_second(self):
+        # Return how many physics steps per second the matches so far ran at.
+        if self.seconds == 0:
+            return 0.0
+        return self.steps / self.seconds
+
+
+def main(): # main function
+    # play the number of matches given on the command line, 100 by default,
+    # with a PredictingController against the TrackingController if a difficulty is given too
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    if len(sys.argv) > 2:
+        engine = Engine(PredictingController(sys.argv[2]), TrackingController())
+    else:
+        engine = Engine()
+    results = engine.play_matches(count)
+    winsA = sum(1 for scoreA, scoreB, steps in results if scoreA > scoreB)
+    winsB = sum(1 for scoreA, scoreB, steps in results if scoreB > scoreA)
+    print('%d matches, player A won %d, player B won %d' % (count, winsA, winsB))
+    print('%d steps in %.2f s, %.0f steps per second' % (engine.steps, engine.seconds, engine.steps_per_second()))
+
+
+if __name__ == '__main__':
+    main()
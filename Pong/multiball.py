@@ -0,0 +1,426 @@
+import pygame, math, time, sys, os, argparse
+from array import array
+
+from common.startup import init_pygame
+from common.profiler import PROFILE_CSV_VARIABLE
+from common.capture import capture_from_env, close_capture
+from common.rewind import RewindBuffer
+from .pong import Game, ScoreSprite, WORLD_SIZE, WINDOW_SIZE
+
+
+# The balls cover at most this share of the field when their size is left to the game
+BALL_COVER = 0.2
+
+# The numbers of balls the stress test tries when none are given
+STRESS_COUNTS = (100, 200, 400, 800, 1600, 3200)
+
+
+class UniformGrid: # UniformGrid class
+    # An object in this class sorts points into square cells of a fixed size.
+    # When the cells are at least as big as a ball, two balls that touch are
+    # always in the same or neighbouring cells, so only those pairs are
+    # compared, and the work grows with the number of balls instead of with
+    # the number of pairs of balls.
+
+    def __init__(self, size, cell_size):
+        # Initialize a UniformGrid.
+        # - self is the UniformGrid to initialize
+        # - size is the (width, height) of the area the points are in
+        # - cell_size is the side of a cell
+        self.cell_size = cell_size
+        self.columns = max(1, math.ceil(size[0] / cell_size))
+        self.rows = max(1, math.ceil(size[1] / cell_size))
+        # the indices of the points in each cell, row by row, the lists are kept between builds
+        self.cells = [[] for cell in range(self.columns * self.rows)]
+        # the cells that hold points, only they are visited and emptied
+        self.occupied = []
+        # the neighbours of each cell that come after it: the next one in its row and
+        # the three below it. Visiting only these meets every pair of cells once.
+        self.neighbours = []
+        for row in range(self.rows):
+            for column in range(self.columns):
+                self.neighbours.append([(row + below) * self.columns + column + right
+                                        for below, right in ((0, 1), (1, -1), (1, 0), (1, 1))
+                                        if 0 <= column + right < self.columns and row + below < self.rows])
+
+    def build(self, xs, ys):
+        # Sort the points into the cells, forgetting the previous ones.
+        # - self is the UniformGrid
+        # - xs and ys are the coordinates of the points, a point outside the area
+        #   goes into the nearest cell
+        cells = self.cells
+        occupied = self.occupied
+        for cell in occupied:
+            cells[cell].clear()
+        occupied.clear()
+        cell_size = self.cell_size
+        last_column = self.columns - 1
+        last_row = self.rows - 1
+        columns = self.columns
+        for index in range(len(xs)):
+            column = int(xs[index] // cell_size)
+            row = int(ys[index] // cell_size)
+            column = 0 if column < 0 else last_column if column > last_column else column
+            row = 0 if row < 0 else last_row if row > last_row else row
+            members = cells[row * columns + column]
+            if not members:
+                occupied.append(row * columns + column)
+            members.append(index)
+
+    def pairs(self):
+        # Yield (i, j) once for every two points in the same or neighbouring cells.
+        # - self is the UniformGrid
+        cells = self.cells
+        neighbours = self.neighbours
+        for cell in self.occupied:
+            members = cells[cell]
+            for a in range(1, len(members)):
+                j = members[a]
+                for b in range(a):
+                    yield members[b], j
+            for neighbour in neighbours[cell]:
+                others = cells[neighbour]
+                if others:
+                    for i in members:
+                        for j in others:
+                            yield i, j
+
+
+class NearestBallController: # NearestBallController class
+    # An object in this class moves its paddle towards the ball that will
+    # reach it first, for a MultiBallGame
+
+    def direction(self, game, paddle):
+        # the paddle is reached at its side that faces the middle of the field
+        if paddle is game.paddleA:
+            face = paddle.left + paddle.width
+            coming = -1
+        else:
+            face = paddle.left
+            coming = 1
+        soonest = math.inf
+        target = None
+        for x, y, velocity_x in zip(game.xs, game.ys, game.velocity_xs):
+            if velocity_x * coming > 0 and (face - x) * coming > 0:
+                arrival = (face - x) / velocity_x
+                if arrival < soonest:
+                    soonest = arrival
+                    target = y
+        if target is None:
+            return 0
+        middle = paddle.top + paddle.height / 2
+        if target < middle - game.paddle_speed:
+            return -1
+        if target > middle + game.paddle_speed:
+            return 1
+        return 0
+
+
+class MultiBallState: # MultiBallState class
+    # An object in this class holds the whole state of a MultiBallGame. The
+    # balls are kept in arrays of the same length as the game's, so saving a
+    # state copies memory and allocates nothing.
+
+    __slots__ = ('xs', 'ys', 'velocity_xs', 'velocity_ys', 'topA', 'topB', 'scoreA', 'scoreB')
+
+    def __init__(self, count):
+        # - count is the number of balls
+        self.xs = array('d', bytes(8 * count))
+        self.ys = array('d', bytes(8 * count))
+        self.velocity_xs = array('d', bytes(8 * count))
+        self.velocity_ys = array('d', bytes(8 * count))
+        self.topA = self.topB = 0
+        self.scoreA = self.scoreB = 0
+
+
+class MultiBallGame(Game): # MultiBallGame class
+    # An object in this class is a game of Pong with many balls at once. The
+    # balls bounce off the walls, the paddles and each other, and each ball
+    # that reaches a back wall scores for the other player. The balls are kept
+    # in arrays of numbers instead of Ball objects, and a UniformGrid finds the
+    # balls that may touch each other.
+
+    def __init__(self, surface, balls=200, radius=None, controllerA=None, controllerB=None, physics_rate=60, seed=None, clock=None, winning_score=None):
+        # Initialize a MultiBallGame.
+        # - self is the MultiBallGame to initialize
+        # - surface is the display window surface object, or None to run without a window
+        # - balls is the number of balls
+        # - radius is the pixel radius of every ball, by default as big as the game's
+        #   ball while all of them cover no more than BALL_COVER of the field
+        # - controllerA and controllerB move the paddles, by default the q/a and p/l keys
+        # - physics_rate, seed and clock are as for a Game
+        # - winning_score ends the game when a player reaches it, None plays until the window is closed
+        Game.__init__(self, surface, controllerA, controllerB, physics_rate, seed, clock)
+        if radius is None:
+            radius = int(math.sqrt(BALL_COVER * WORLD_SIZE[0] * WORLD_SIZE[1] / (balls * math.pi)))
+            radius = max(1, min(self.ball_radius, radius))
+        self.ball_radius = radius
+        self.winning_score = math.inf if winning_score is None else winning_score
+
+        # Every ball starts somewhere between the paddles, moving towards one of them.
+        rng = self.rng
+        left = self.paddleA.left + self.paddleA.width + radius
+        right = self.paddleB.left - radius
+        self.count = balls
+        self.xs = array('d', (rng.uniform(left, right) for ball in range(balls)))
+        self.ys = array('d', (rng.uniform(radius, WORLD_SIZE[1] - radius) for ball in range(balls)))
+        self.velocity_xs = array('d', (rng.choice((-1, 1)) * rng.uniform(3, 6) * self.tick_scale for ball in range(balls)))
+        self.velocity_ys = array('d', (rng.uniform(-3, 3) * self.tick_scale for ball in range(balls)))
+        # where the balls were at the previous physics step, drawing happens in between
+        self.previous_xs = array('d', self.xs)
+        self.previous_ys = array('d', self.ys)
+
+        # The cells are one ball wide, so two balls that touch are in neighbouring cells.
+        self.grid = UniformGrid(WORLD_SIZE, 2 * radius)
+        # these keep count of the pairs of balls compared and of those that touched
+        self.pair_tests = 0
+        self.contacts = 0
+
+        # Every ball is saved after every step, so the history is kept shorter than a one ball game's.
+        self.history = RewindBuffer(2 * physics_rate, lambda: MultiBallState(balls))
+        self.snapshot(self.history.push())
+
+        # The balls are too many to be sprites of their own. They are blitted over the paddles
+        # and scores every frame, so the one ball sprite the Game made is left out.
+        if self.sprites is not None:
+            self.sprites.remove(self.ball_sprite)
+            # the scores run to many digits, so B's grows leftwards from the right edge
+            self.sprites.remove(self.scoreB_sprite)
+            self.scoreB_sprite = ScoreSprite(self.score_text, (WORLD_SIZE[0] - 10, 10), 'topright')
+            self.sprites.add(self.scoreB_sprite)
+            size = 2 * radius
+            self.ball_image = pygame.Surface((size, size)).convert()
+            self.ball_image.set_colorkey((0, 0, 0))
+            pygame.draw.circle(self.ball_image, self.ball.color, (radius, radius), radius)
+
+    def describe(self):
+        # Return a short summary of the game.
+        return 'score %d-%d after %d steps with %d balls' % (self.scoreA, self.scoreB, self.steps, self.count)
+
+    def draw(self, alpha=1.0):
+        # Draw all game objects.
+        # - self is the MultiBallGame to draw
+        # - alpha is how far to draw between the previous and the current physics step, from 0 to 1
+        if self.sprites is None:
+            return
+        for sprite in self.sprites:
+            sprite.follow(alpha)
+        self.scoreA_sprite.show(self.scoreA)
+        self.scoreB_sprite.show(self.scoreB)
+
+        # The balls are everywhere, so the whole field is put back and drawn again every frame.
+        field = self.surface.get_rect()
+        self.sprites.repaint_rect(field)
+        self.sprites.draw(self.surface)
+        radius = self.ball_radius
+        xs = self.xs
+        ys = self.ys
+        previous_xs = self.previous_xs
+        previous_ys = self.previous_ys
+        image = self.ball_image
+        self.surface.blits([(image, (round(previous_xs[i] + (xs[i] - previous_xs[i]) * alpha) - radius,
+                                     round(previous_ys[i] + (ys[i] - previous_ys[i]) * alpha) - radius))
+                            for i in range(self.count)], False)
+        self.dirty_rects.append(field)
+
+    def update(self):
+        # Update the game objects for the next frame.
+        # - self is the MultiBallGame to update
+        xs = self.xs
+        ys = self.ys
+        velocity_xs = self.velocity_xs
+        velocity_ys = self.velocity_ys
+        self.previous_xs[:] = xs
+        self.previous_ys[:] = ys
+        self.paddleA.save_position()
+        self.paddleB.save_position()
+
+        # Move the balls. A ball that reaches a wall is put back against it and sent the other
+        # way, so a crowd of balls can't push one out of the field, and the back walls score.
+        radius = self.ball_radius
+        right = WORLD_SIZE[0] - radius
+        bottom = WORLD_SIZE[1] - radius
+        for i in range(self.count):
+            x = xs[i] + velocity_xs[i]
+            y = ys[i] + velocity_ys[i]
+            if x >= right:
+                x = right
+                if velocity_xs[i] > 0:
+                    velocity_xs[i] = -velocity_xs[i]
+                    self.scoreA += 1
+            elif x <= radius:
+                x = radius
+                if velocity_xs[i] < 0:
+                    velocity_xs[i] = -velocity_xs[i]
+                    self.scoreB += 1
+            if y >= bottom:
+                y = bottom
+                velocity_ys[i] = -abs(velocity_ys[i])
+            elif y <= radius:
+                y = radius
+                velocity_ys[i] = abs(velocity_ys[i])
+            xs[i] = x
+            ys[i] = y
+
+        self.move_paddle(self.paddleA, self.controllerA.direction(self, self.paddleA))
+        self.move_paddle(self.paddleB, self.controllerB.direction(self, self.paddleB))
+
+        # Only a ball whose path this step crosses a paddle's column can hit the paddle,
+        # and the whole path is tested for those few, as in Game.bounce.
+        previous_xs = self.previous_xs
+        for paddle, away in ((self.paddleA, 1), (self.paddleB, -1)):
+            low = paddle.left - radius
+            high = paddle.left + paddle.width + radius
+            for i in range(self.count):
+                start_x = previous_xs[i]
+                x = xs[i]
+                if (x - start_x) * away < 0 and min(start_x, x) <= high and max(start_x, x) >= low:
+                    self.bounce_ball(i, paddle, away)
+
+        # The grid finds the balls near each other, and the ones that touch bounce apart.
+        grid = self.grid
+        grid.build(xs, ys)
+        diameter = 2 * radius
+        reach = diameter * diameter
+        tests = 0
+        contacts = 0
+        for i, j in grid.pairs():
+            tests += 1
+            dx = xs[j] - xs[i]
+            dy = ys[j] - ys[i]
+            distance = dx * dx + dy * dy
+            if distance >= reach or distance == 0:
+                continue
+            contacts += 1
+            distance = math.sqrt(distance)
+            normal_x = dx / distance
+            normal_y = dy / distance
+            # move both balls apart until they only touch
+            push = (diameter - distance) / 2
+            xs[i] -= normal_x * push
+            ys[i] -= normal_y * push
+            xs[j] += normal_x * push
+            ys[j] += normal_y * push
+            # balls of the same mass swap the parts of their velocities along the line
+            # between their centers, if they are moving towards each other
+            closing = (velocity_xs[j] - velocity_xs[i]) * normal_x + (velocity_ys[j] - velocity_ys[i]) * normal_y
+            if closing < 0:
+                velocity_xs[i] += closing * normal_x
+                velocity_ys[i] += closing * normal_y
+                velocity_xs[j] -= closing * normal_x
+                velocity_ys[j] -= closing * normal_y
+        self.pair_tests += tests
+        self.contacts += contacts
+
+        self.steps += 1
+
+    def bounce_ball(self, i, paddle, away):
+        # Bounce ball i off a paddle if its path over this step runs into it, see Game.bounce.
+        # - self is the MultiBallGame
+        # - i is the index of the ball
+        # - paddle is the Paddle to check
+        # - away is 1 if the paddle sends the ball to the right and -1 to the left
+        start_x = self.previous_xs[i]
+        end_x = self.xs[i]
+        t = paddle.sweep((start_x, self.previous_ys[i]), (end_x, self.ys[i]), self.ball_radius)
+        if t is None:
+            return False
+        touch_x = start_x + (end_x - start_x) * t
+        self.xs[i] = touch_x - (end_x - start_x) * (1 - t)
+        self.velocity_xs[i] = away * abs(self.velocity_xs[i])
+        self.velocity_ys[i] = -self.rng.randint(-2,3) * self.tick_scale
+        return True
+
+    def snapshot(self, state):
+        # Copy the state of the game into a MultiBallState and return it.
+        state.xs[:] = self.xs
+        state.ys[:] = self.ys
+        state.velocity_xs[:] = self.velocity_xs
+        state.velocity_ys[:] = self.velocity_ys
+        state.topA = self.paddleA.top
+        state.topB = self.paddleB.top
+        state.scoreA = self.scoreA
+        state.scoreB = self.scoreB
+        return state
+
+    def restore(self, state):
+        # Put the game back into the state saved in a MultiBallState.
+        self.xs[:] = state.xs
+        self.ys[:] = state.ys
+        self.velocity_xs[:] = state.velocity_xs
+        self.velocity_ys[:] = state.velocity_ys
+        self.previous_xs[:] = state.xs
+        self.previous_ys[:] = state.ys
+        self.paddleA.top = state.topA
+        self.paddleB.top = state.topB
+        self.scoreA = state.scoreA
+        self.scoreB = state.scoreB
+        self.paddleA.save_position()
+        self.paddleB.save_position()
+        self.continue_game = self.scoreA < self.winning_score and self.scoreB < self.winning_score
+
+
+def stress(counts=STRESS_COUNTS, steps=300, surface=None, seed=0):
+    # Play steps physics steps with each number of balls, two NearestBallControllers
+    # against each other, and return a list of (balls, milliseconds per step,
+    # pairs compared per step, contacts per step).
+    # - surface is the surface to draw every step on as well, or None
+    results = []
+    for count in counts:
+        game = MultiBallGame(surface, count, controllerA=NearestBallController(),
+                             controllerB=NearestBallController(), seed=seed)
+        start = time.perf_counter()
+        for step in range(steps):
+            game.update()
+            if surface is not None:
+                game.draw()
+                game.show()
+        seconds = time.perf_counter() - start
+        results.append((count, 1000 * seconds / steps, game.pair_tests / steps, game.contacts / steps))
+    return results
+
+
+def main(argv=None): # main function
+    parser = argparse.ArgumentParser(description='Pong with many balls, player A plays with q/a and player B with p/l.')
+    parser.add_argument('--balls', type=int, default=200, help='the number of balls')
+    parser.add_argument('--radius', type=int, default=None, help='the radius of the balls, smaller for more balls by default')
+    parser.add_argument('--to', type=int, default=None, help='the score that wins, by default play until the window is closed')
+    parser.add_argument('--computer', action='store_true', help='let the computer play paddle B')
+    parser.add_argument('--size', default='%dx%d' % WINDOW_SIZE, help='window size as WIDTHxHEIGHT, the field is scaled to fit')
+    parser.add_argument('--stress', type=int, nargs='*', metavar='BALLS',
+                        help='time the physics without a window for each number of balls instead of playing')
+    parser.add_argument('--steps', type=int, default=300, help='physics steps per stress run')
+    parser.add_argument('--draw', action='store_true', help='draw every stress step too, under the SDL dummy driver unless one is set')
+    args = parser.parse_args(argv)
+
+    if args.stress is not None:
+        surface = None
+        if args.draw:
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            init_pygame()
+            surface = pygame.display.set_mode(WINDOW_SIZE)
+        budget = 1000 / 60
+        print('%7s %10s %12s %12s %10s  %s' % ('balls', 'ms/step', 'grid pairs', 'all pairs', 'contacts', 'keeps up at 60 Hz'))
+        for count, ms, pairs, contacts in stress(args.stress or STRESS_COUNTS, args.steps, surface):
+            print('%7d %10.2f %12.0f %12d %10.1f  %s' % (count, ms, pairs, count * (count - 1) // 2, contacts,
+                                                          'yes' if ms <= budget else 'no'))
+        return 0
+
+    init_pygame()
+    width, height = (int(number) for number in args.size.lower().split('x'))
+    pygame.display.set_mode((width, height), pygame.RESIZABLE)
+    pygame.display.set_caption('Pong with %d balls' % args.balls)
+    controllerB = NearestBallController() if args.computer else None
+    game = MultiBallGame(pygame.display.get_surface(), args.balls, args.radius, controllerB=controllerB, winning_score=args.to)
+    game.profiler.csv_path = os.environ.get(PROFILE_CSV_VARIABLE)
+    game.profiler.watch_signal()
+    game.capture = capture_from_env(game.surface)
+    game.play()
+    game.profiler.close()
+    pygame.quit()
+    close_capture(game.capture)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,516 @@
+import asyncio, struct, random, argparse, collections, math, sys
+
+import pygame
+
+from .pong import Game, PongState, KeyboardController, WINDOW_SIZE
+from .headless import TrackingController, RandomController
+from common.startup import init_pygame
+
+
+# Two player Pong over UDP. The server runs the only real game and sends its
+# state to both players after every physics step. Each client plays its own
+# paddle's input into a local copy of the game straight away, and when a
+# state arrives it puts the copy back to that state and plays the inputs the
+# server has not seen yet on top of it again. Every packet is a few bytes
+# packed with struct.
+
+# The kinds of packets, the first byte of every packet
+HELLO, WELCOME, FULL, INPUT, STATE = range(1, 6)
+
+# HELLO: kind - a client asks to join
+HELLO_PACKET = struct.Struct('<B')
+# WELCOME: kind, paddle, physics rate, seed - the server gives a client its paddle
+WELCOME_PACKET = struct.Struct('<BBHQ')
+# FULL: kind - both paddles are taken
+FULL_PACKET = struct.Struct('<B')
+# INPUT: kind, count, newest sequence number, then count directions as signed
+# bytes, oldest first. Every packet repeats the latest few directions, so a
+# lost packet costs nothing as long as one of the next few arrives.
+INPUT_HEADER = struct.Struct('<BBI')
+# STATE: kind, server step, the newest input of this client the server has
+# played, ball x, y, velocity x, y, the paddle tops, both paddles' current
+# directions and both scores
+STATE_PACKET = struct.Struct('<BIIffffffbbBB')
+
+# How many directions each INPUT packet repeats
+REDUNDANCY = 8
+
+# The server keeps at most this many inputs of a client waiting, so a burst
+# of late packets can't leave that client behind for good
+MAX_QUEUED_INPUTS = 4
+
+DEFAULT_PORT = 5005
+
+
+def parse_address(text, default_host='127.0.0.1'):
+    # Return the (host, port) of a 'host:port', 'host' or 'port' string.
+    host, separator, port = text.rpartition(':')
+    if not separator:
+        if text.isdigit():
+            return default_host, int(text)
+        return text, DEFAULT_PORT
+    return host or default_host, int(port)
+
+
+class NetworkController: # NetworkController class
+    # An object in this class moves a paddle with the directions that came
+    # over the network, one per physics step. When none is waiting, the
+    # paddle keeps going the way it went last.
+
+    def __init__(self):
+        # the waiting (sequence number, direction) pairs, oldest first
+        self.queue = collections.deque()
+        # the newest sequence number that arrived and the newest one played
+        self.received = 0
+        self.played = 0
+        self.current = 0
+
+    def receive(self, newest, directions):
+        # Queue the directions of an INPUT packet that are new.
+        # - newest is the sequence number of the last direction
+        # - directions are the directions, oldest first
+        first = newest - len(directions) + 1
+        for sequence, direction in enumerate(directions, first):
+            if sequence > self.received:
+                self.queue.append((sequence, direction))
+                self.received = sequence
+        while len(self.queue) > MAX_QUEUED_INPUTS:
+            self.played, self.current = self.queue.popleft()
+
+    def direction(self, game, paddle):
+        if self.queue:
+            self.played, self.current = self.queue.popleft()
+        return self.current
+
+
+class Server(asyncio.DatagramProtocol): # Server class
+    # An object in this class runs the game both clients play, which is the
+    # only game whose state counts
+
+    def __init__(self, seed=None, physics_rate=60):
+        # Initialize a Server.
+        # - self is the Server to initialize
+        # - seed seeds the game, it is sent to the clients so their copies start the same
+        # - physics_rate is how many physics steps run per second
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(63)
+        self.physics_rate = physics_rate
+        self.controllers = (NetworkController(), NetworkController())
+        self.game = Game(None, self.controllers[0], self.controllers[1], physics_rate, seed=self.seed)
+        self.state = PongState()
+        # the address of each paddle's client, in paddle order
+        self.players = []
+        self.transport = None
+        self.started = asyncio.Event()
+        self.packets_in = 0
+        self.packets_out = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.packets_in += 1
+        # a packet too short for what its kind needs is dropped before it is unpacked
+        if not data:
+            return
+        kind = data[0]
+        if kind == HELLO:
+            if address not in self.players and len(self.players) < 2:
+                self.players.append(address)
+                if len(self.players) == 2:
+                    self.started.set()
+            if address in self.players:
+                paddle = self.players.index(address)
+                self.send(WELCOME_PACKET.pack(WELCOME, paddle, self.physics_rate, self.seed), address)
+            else:
+                self.send(FULL_PACKET.pack(FULL), address)
+        elif kind == INPUT and address in self.players and len(data) >= INPUT_HEADER.size:
+            kind, count, newest = INPUT_HEADER.unpack_from(data)
+            if len(data) != INPUT_HEADER.size + count:
+                return
+            directions = struct.unpack_from('<%db' % count, data, INPUT_HEADER.size)
+            self.controllers[self.players.index(address)].receive(newest, directions)
+
+    def send(self, data, address):
+        self.transport.sendto(data, address)
+        self.packets_out += 1
+
+    def broadcast(self):
+        # Send the game's state to both clients.
+        state = self.game.snapshot(self.state)
+        for paddle, address in enumerate(self.players):
+            self.send(STATE_PACKET.pack(STATE, self.game.steps, self.controllers[paddle].played,
+                                        state.ball_x, state.ball_y, state.velocity_x, state.velocity_y,
+                                        state.topA, state.topB,
+                                        self.controllers[0].current, self.controllers[1].current,
+                                        state.scoreA, state.scoreB), address)
+
+    async def run(self, final_states=30):
+        # Wait for two players, then step the game in real time until a player
+        # wins, and send the final state a few more times in case some are lost.
+        await self.started.wait()
+        loop = asyncio.get_running_loop()
+        step = 1 / self.physics_rate
+        next_step = loop.time()
+        while self.game.continue_game:
+            self.game.update()
+            self.game.decide_continue()
+            self.broadcast()
+            next_step += step
+            await asyncio.sleep(max(0.0, next_step - loop.time()))
+        for repeat in range(final_states):
+            self.broadcast()
+            await asyncio.sleep(step)
+
+
+class Client(asyncio.DatagramProtocol): # Client class
+    # An object in this class plays one paddle against a Server. It predicts
+    # its own paddle, and the ball, in a local copy of the game and fixes the
+    # copy up whenever the server's state comes in.
+
+    def __init__(self, controller, surface=None):
+        # Initialize a Client.
+        # - self is the Client to initialize
+        # - controller moves this client's paddle, e.g. a KeyboardController
+        # - surface is the surface to draw on, or None to play without a window
+        self.controller = controller
+        self.surface = surface
+        self.transport = None
+        # the local game, made once the server sends WELCOME
+        self.game = None
+        self.paddle = None
+        self.welcomed = asyncio.Event()
+        self.full = False
+        # the newest state from the server that has not been applied yet
+        self.latest = None
+        self.latest_step = -1
+        self.state = PongState()
+        # the inputs the server has not played yet, as (sequence number, direction)
+        self.sequence = 0
+        self.pending = collections.deque()
+        self.sent = collections.deque(maxlen=REDUNDANCY)
+        # how far each reconciliation moved the prediction, in pixels
+        self.corrections = 0
+        self.paddle_error = 0.0
+        self.ball_error = 0.0
+        self.max_ball_error = 0.0
+        self.packets_in = 0
+        self.packets_out = 0
+        self.closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, address):
+        self.packets_in += 1
+        if not data:
+            return
+        kind = data[0]
+        if kind == WELCOME and self.game is None and len(data) == WELCOME_PACKET.size:
+            kind, paddle, physics_rate, seed = WELCOME_PACKET.unpack(data)
+            self.paddle = paddle
+            controllers = (NetworkController(), NetworkController())
+            self.game = Game(self.surface, controllers[0], controllers[1], physics_rate, seed=seed)
+            self.controllers = controllers
+            self.welcomed.set()
+        elif kind == FULL:
+            self.full = True
+            self.welcomed.set()
+        elif kind == STATE and len(data) == STATE_PACKET.size:
+            fields = STATE_PACKET.unpack(data)
+            # packets can arrive out of order, an older state is no use
+            if fields[1] > self.latest_step:
+                self.latest_step = fields[1]
+                self.latest = fields
+
+    def send(self, data):
+        self.transport.sendto(data)
+        self.packets_out += 1
+
+    async def join(self, retry=0.25):
+        # Say HELLO until the server answers.
+        while not self.welcomed.is_set():
+            self.send(HELLO_PACKET.pack(HELLO))
+            try:
+                await asyncio.wait_for(self.welcomed.wait(), retry)
+            except asyncio.TimeoutError:
+                pass
+        if self.full:
+            raise ConnectionRefusedError('the server already has two players')
+
+    def reconcile(self):
+        # Put the local game back to the newest server state and play the inputs
+        # the server has not played yet on top of it again.
+        game = self.game
+        state = self.state
+        own = (game.paddleA, game.paddleB)[self.paddle]
+        predicted_top = own.top
+        predicted_ball = tuple(game.ball_center)
+
+        (kind, step, acknowledged, state.ball_x, state.ball_y, state.velocity_x, state.velocity_y,
+         state.topA, state.topB, directionA, directionB, state.scoreA, state.scoreB) = self.latest
+        self.latest = None
+        game.restore(state)
+        while self.pending and self.pending[0][0] <= acknowledged:
+            self.pending.popleft()
+
+        # the other paddle is assumed to keep going the way the server last saw it go
+        self.controllers[1 - self.paddle].current = (directionA, directionB)[1 - self.paddle]
+        mine = self.controllers[self.paddle]
+        for sequence, direction in self.pending:
+            mine.current = direction
+            game.update()
+
+        self.corrections += 1
+        self.paddle_error += abs(own.top - predicted_top)
+        error = math.dist(predicted_ball, game.ball_center)
+        self.ball_error += error
+        self.max_ball_error = max(self.max_ball_error, error)
+
+    def step(self):
+        # Play one physics step: fix the game up with the newest server state,
+        # then ask the controller for a direction, send it and play it at once.
+        if self.latest is not None:
+            self.reconcile()
+        game = self.game
+        own = (game.paddleA, game.paddleB)[self.paddle]
+        direction = self.controller.direction(game, own)
+        self.sequence += 1
+        self.pending.append((self.sequence, direction))
+        self.sent.append(direction)
+        self.send(INPUT_HEADER.pack(INPUT, len(self.sent), self.sequence) + struct.pack('<%db' % len(self.sent), *self.sent))
+        self.controllers[self.paddle].current = direction
+        game.update()
+
+    async def play(self):
+        # Play until a player wins or the window is closed.
+        await self.join()
+        game = self.game
+        loop = asyncio.get_running_loop()
+        # the clocks start with the server's first state
+        while self.latest is None:
+            await asyncio.sleep(0.001)
+        step_seconds = game.step_ms / 1000
+        frame_seconds = 1 / game.FPS
+        last = loop.time()
+        accumulator = 0.0
+        while game.continue_game and not self.closed:
+            if self.surface is not None:
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        self.closed = True
+            now = loop.time()
+            accumulator = min(accumulator + now - last, game.max_catch_up_ms / 1000)
+            last = now
+            while accumulator >= step_seconds:
+                self.step()
+                accumulator -= step_seconds
+            if self.latest is not None:
+                # the game may have ended in a state that came after the last step
+                self.reconcile()
+            if self.surface is not None:
+                game.draw(accumulator / step_seconds)
+                game.show()
+            await asyncio.sleep(max(0.0, frame_seconds - (loop.time() - now)))
+
+    def report(self):
+        # Return a one line summary of the prediction errors.
+        count = max(self.corrections, 1)
+        return ('paddle %s: %d corrections, mean paddle error %.2f px, mean ball error %.2f px, max ball error %.1f px'
+                % ('AB'[self.paddle], self.corrections, self.paddle_error / count, self.ball_error / count, self.max_ball_error))
+
+
+class LatencyProxy(asyncio.DatagramProtocol): # LatencyProxy class
+    # An object in this class passes packets between clients and a server,
+    # holding each one back by a random delay and dropping some, so the game
+    # can be tried on one machine the way it plays over a real network.
+
+    def __init__(self, server_address, latency_ms=50, jitter_ms=10, loss=0.0, rng=None):
+        # Initialize a LatencyProxy.
+        # - self is the LatencyProxy to initialize
+        # - server_address is the (host, port) of the server
+        # - latency_ms is the average round trip time to add, half of it each way
+        # - jitter_ms is how far each packet's delay may be from the average
+        # - loss is the fraction of packets that are dropped
+        # - rng is the random.Random the delays and losses are drawn with
+        self.server_address = server_address
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.loss = loss
+        self.rng = rng if rng is not None else random.Random()
+        self.transport = None
+        # one endpoint towards the server per client, so the server tells them apart
+        self.upstreams = {}
+        self.dropped = 0
+        self.passed = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def delay(self):
+        # Return how long the next packet is held back, in seconds.
+        one_way = self.latency_ms / 2 + self.rng.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, one_way) / 1000
+
+    def forward(self, transport, data, address=None):
+        # Send a packet on after its delay, unless it is lost.
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        self.passed += 1
+        asyncio.get_running_loop().call_later(self.delay(), transport.sendto, data, address)
+
+    def datagram_received(self, data, address):
+        upstream = self.upstreams.get(address)
+        if upstream is None:
+            upstream = _Upstream(self, address)
+            self.upstreams[address] = upstream
+            asyncio.get_running_loop().create_task(upstream.connect())
+        upstream.send(data)
+
+
+class _Upstream(asyncio.DatagramProtocol):
+    # The proxy's endpoint towards the server for one client
+
+    def __init__(self, proxy, client_address):
+        self.proxy = proxy
+        self.client_address = client_address
+        self.transport = None
+        # packets that arrived before the endpoint was ready
+        self.waiting = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, remote_addr=self.proxy.server_address)
+        for data in self.waiting:
+            self.proxy.forward(self.transport, data)
+        self.waiting = None
+
+    def send(self, data):
+        if self.transport is None:
+            self.waiting.append(data)
+        else:
+            self.proxy.forward(self.transport, data)
+
+    def datagram_received(self, data, address):
+        self.proxy.forward(self.proxy.transport, data, self.client_address)
+
+
+async def serve(address, seed=None, physics_rate=60):
+    # Run a server on address until its game ends and return it.
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(lambda: Server(seed, physics_rate), local_addr=address)
+    try:
+        await server.run()
+    finally:
+        transport.close()
+    return server
+
+
+async def connect(address, controller, surface=None):
+    # Play one paddle against the server at address and return the Client.
+    loop = asyncio.get_running_loop()
+    transport, client = await loop.create_datagram_endpoint(lambda: Client(controller, surface), remote_addr=address)
+    try:
+        await client.play()
+    finally:
+        transport.close()
+    return client
+
+
+async def proxy(listen_address, server_address, latency_ms, jitter_ms, loss, seconds=None):
+    # Run a LatencyProxy, for the given number of seconds or for ever.
+    loop = asyncio.get_running_loop()
+    transport, latency_proxy = await loop.create_datagram_endpoint(
+        lambda: LatencyProxy(server_address, latency_ms, jitter_ms, loss), local_addr=listen_address)
+    try:
+        if seconds is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(seconds)
+    finally:
+        transport.close()
+        for upstream in latency_proxy.upstreams.values():
+            if upstream.transport is not None:
+                upstream.transport.close()
+    return latency_proxy
+
+
+async def loopback(latency_ms, jitter_ms, loss, seconds, seed=0):
+    # Play a server, a LatencyProxy and two computer players on this machine
+    # for at most the given number of seconds, and print how they did.
+    loop = asyncio.get_running_loop()
+    rng = random.Random(seed)
+    server_transport, server = await loop.create_datagram_endpoint(lambda: Server(seed), local_addr=('127.0.0.1', 0))
+    server_address = server_transport.get_extra_info('sockname')
+    proxy_transport, latency_proxy = await loop.create_datagram_endpoint(
+        lambda: LatencyProxy(server_address, latency_ms, jitter_ms, loss, rng), local_addr=('127.0.0.1', 0))
+    proxy_address = proxy_transport.get_extra_info('sockname')
+
+    clients = []
+    for controller in (TrackingController(), RandomController(rng)):
+        transport, client = await loop.create_datagram_endpoint(lambda: Client(controller), remote_addr=proxy_address)
+        clients.append((transport, client))
+    try:
+        await asyncio.wait_for(asyncio.gather(server.run(), *(client.play() for transport, client in clients)), seconds)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        for transport, client in clients:
+            transport.close()
+        proxy_transport.close()
+        for upstream in latency_proxy.upstreams.values():
+            if upstream.transport is not None:
+                upstream.transport.close()
+        server_transport.close()
+
+    game = server.game
+    print('%d ms round trip, %d ms jitter, %.0f%% loss: %d packets passed, %d dropped'
+          % (latency_ms, jitter_ms, loss * 100, latency_proxy.passed, latency_proxy.dropped))
+    print('server: score %d-%d after %d steps' % (game.scoreA, game.scoreB, game.steps))
+    for transport, client in clients:
+        if client.game is not None:
+            print(client.report())
+    return server, [client for transport, client in clients]
+
+
+def main(argv=None): # main function
+    parser = argparse.ArgumentParser(description='Two player Pong over UDP.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    server_parser = commands.add_parser('server', help='run the game for two clients')
+    server_parser.add_argument('--listen', default='0.0.0.0:%d' % DEFAULT_PORT, help='address to listen on')
+    server_parser.add_argument('--seed', type=int, default=None)
+    client_parser = commands.add_parser('client', help='play one paddle with the up and down keys')
+    client_parser.add_argument('server', help='host:port of the server, or of a proxy')
+    proxy_parser = commands.add_parser('proxy', help='add latency, jitter and loss between clients and a server')
+    proxy_parser.add_argument('server', help='host:port of the server')
+    proxy_parser.add_argument('--listen', default='127.0.0.1:%d' % (DEFAULT_PORT + 1), help='address the clients connect to')
+    loopback_parser = commands.add_parser('loopback', help='play two computer players through a proxy on this machine')
+    loopback_parser.add_argument('--seconds', type=float, default=15)
+    loopback_parser.add_argument('--seed', type=int, default=0)
+    for latency_parser in (proxy_parser, loopback_parser):
+        latency_parser.add_argument('--latency', type=float, default=100, help='round trip time to add in milliseconds')
+        latency_parser.add_argument('--jitter', type=float, default=15, help='largest change of the one way delay in milliseconds')
+        latency_parser.add_argument('--loss', type=float, default=0.02, help='fraction of packets to drop')
+    args = parser.parse_args(argv)
+
+    if args.command == 'server':
+        server = asyncio.run(serve(parse_address(args.listen), args.seed))
+        print('score %d-%d' % (server.game.scoreA, server.game.scoreB))
+    elif args.command == 'client':
+        init_pygame()
+        surface = pygame.display.set_mode(WINDOW_SIZE)
+        pygame.display.set_caption('Pong')
+        client = asyncio.run(connect(parse_address(args.server), KeyboardController(pygame.K_UP, pygame.K_DOWN), surface))
+        pygame.quit()
+        print(client.report())
+    elif args.command == 'proxy':
+        asyncio.run(proxy(parse_address(args.listen), parse_address(args.server), args.latency, args.jitter, args.loss))
+    else:
+        asyncio.run(loopback(args.latency, args.jitter, args.loss, args.seconds, args.seed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,24 +1,92 @@
-import pygame, math, random
+import pygame, math, random, os, argparse
 
+from common.hud import HudText
+from common.startup import init_pygame, StartupTimer
+from common.profiler import FrameProfiler, PROFILE_CSV_VARIABLE
+from common.rewind import RewindBuffer
+from common.replay import RealClock, VirtualClock, recording_from_env, save_recording, PADDLE, REWIND, QUIT
+from common.capture import capture_from_env, close_capture
+
+# The size of the playing field in world units. The game's rules only know these, and the
+# picture is drawn at this size, one pixel per unit, then scaled to fit the window.
+WORLD_SIZE = (400, 400)
+
+# The size of the window when none is asked for, the field fits it without scaling
+WINDOW_SIZE = WORLD_SIZE
+
+# The phases of a frame that the profiler times, in the order play() runs them
+PROFILE_PHASES = ('handle_events', 'update', 'decide_continue', 'draw', 'display.update')
 
 # User-defined functions
 
-def main(): # main function
-    # initialize all pygame modules (some need initialization)
-    pygame.init()
-    # create a pygame display window
-    pygame.display.set_mode((400, 400))
+def main(argv=None): # main function
+    parser = argparse.ArgumentParser(description='Two player Pong, player A plays with q/a and player B with p/l.')
+    parser.add_argument('--computer', choices=('easy', 'medium', 'hard', 'perfect'),
+                        help='let the computer play paddle B at this difficulty')
+    parser.add_argument('--size', default='%dx%d' % WINDOW_SIZE, help='window size as WIDTHxHEIGHT, the field is scaled to fit')
+    parser.add_argument('--fullscreen', action='store_true', help='fill the screen, the field is scaled to fit')
+    args = parser.parse_args(argv)
+    # time the start so a slow launch shows up
+    startup = StartupTimer('Pong')
+    # initialize only the pygame modules the game uses
+    init_pygame()
+    startup.mark('init')
+    # create a pygame display window, the game draws at WORLD_SIZE and scales that to the window
+    if args.fullscreen:
+        pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+    else:
+        width, height = (int(number) for number in args.size.lower().split('x'))
+        pygame.display.set_mode((width, height), pygame.RESIZABLE)
     # set the title of the display window
-    WHITE = (255,255,255)
     pygame.display.set_caption('Pong')   
+    startup.mark('display')
     # get the display surface
     w_surface = pygame.display.get_surface() 
-    # create a game object
-    game = Game(w_surface)
+    # create a game object, a recorded game uses a seed and a clock that can be played again
+    controllerB = None
+    if args.computer is not None:
+        from .headless import PredictingController
+        controllerB = PredictingController(args.computer)
+    input_log = recording_from_env('Pong', 1000 / 60)
+    if input_log is None:
+        game = Game(w_surface, controllerB=controllerB)
+    else:
+        game = Game(w_surface, controllerB=controllerB, seed=input_log.seed, clock=VirtualClock(input_log.frame_ms), input_log=input_log)
+    startup.mark('game')
+    startup.finish()
+    # The frame profile is written out on exit or on SIGUSR1 if a file is named.
+    game.profiler.csv_path = os.environ.get(PROFILE_CSV_VARIABLE)
+    game.profiler.watch_signal()
+    # the frames are captured to a file or an encoder if one is named
+    game.capture = capture_from_env(game.surface)
     # start the main game loop by calling the play method on the game object
     game.play() 
+    game.profiler.close()
+    save_recording(input_log)
     # quit pygame and clean up the pygame window
     pygame.quit() 
+    # the capture is finished last, it raises what went wrong writing it, if anything
+    close_capture(game.capture)
+
+
+def replay(log, surface=None):
+    # Play a recorded session again as fast as the computer can and return the Game.
+    # - log is the InputLog of the session
+    # - surface is the surface to draw on, or None to skip drawing
+    game = Game(surface, ReplayController(log, 0), ReplayController(log, 1), seed=log.seed,
+                clock=VirtualClock(log.frame_ms), **log.options)
+    frames = log.frames()
+    last_frame = log.last_frame()
+    rewinding = False
+    while not game.close_clicked and game.frame <= last_frame:
+        events = []
+        for frame, kind, a, b in frames.get(game.frame, ()):
+            if kind == REWIND:
+                rewinding = bool(a)
+            elif kind == QUIT:
+                events.append(pygame.event.Event(pygame.QUIT))
+        game.play_frame(events, game.clock.frame(0), rewinding)
+    return game
 
 
 # User-defined classes
@@ -26,23 +94,50 @@ def main(): # main function
 class Game: # Game class
     # An object in this class represents a complete game
 
-    def __init__(self, surface):
+    def __init__(self, surface, controllerA=None, controllerB=None, physics_rate=60, seed=None, clock=None, input_log=None):
         # Initialize a Game.
         # - self is the Game to initialize
-        # - surface is the display window surface object
+        # - surface is the display window surface object, or None to run without a window
+        # - controllerA and controllerB move the paddles, by default the q/a and p/l keys
+        # - physics_rate is how many physics steps run per second, whatever the frame rate
+        # - seed seeds the ball's start and bounces, the same seed and input play the same game
+        # - clock tells how long each frame took, a RealClock unless another one is given
+        # - input_log is an InputLog that the players' input is recorded to, or None
         # We also initialize a background with a black color
 
         # === objects that are part of every game that we will discuss
-        self.surface = surface
+        # self.window is the display window and self.surface what the game draws on, see fit_window()
+        self.window = surface
+        self.surface = None
+        if surface is not None:
+            self.surface = surface if surface.get_size() == WORLD_SIZE else pygame.Surface(WORLD_SIZE).convert()
         self.bg_color = pygame.Color('black')
 
-        # Frame rate that we will keep the game at. pygame.time.Clock() helps enable this. 
+        # Frame rate that we will keep the drawing at. pygame.time.Clock() helps enable this. 
         self.FPS = 60
         self.game_Clock = pygame.time.Clock()
+
+        # The physics runs in fixed steps of its own, separate from the drawing. All speeds below are
+        # given in pixels per 1/60 of a second and tick_scale turns them into pixels per physics step.
+        self.physics_rate = physics_rate
+        self.step_ms = 1000 / physics_rate
+        self.tick_scale = 60 / physics_rate
+        # At most this much time is caught up after a stall, so a long hitch can't snowball.
+        self.max_catch_up_ms = 250
         
         # Variables we will use to decide to continue game or not.
         self.close_clicked = False
         self.continue_game = True
+        # The first player to this score wins.
+        self.winning_score = 11
+
+        # The game's own random numbers and clock, so a session can be played again exactly.
+        self.rng = random.Random(seed)
+        self.clock = clock if clock is not None else RealClock()
+        self.input_log = input_log
+        # The number of frames and of physics steps played so far.
+        self.frame = 0
+        self.steps = 0
 
         # === game specific objects. I have incorporated them individually so that they pass through the Game object.
         
@@ -64,18 +159,68 @@ class Game: # Game class
 
         # Now for the ball's attributes which are its radius, center and velocity.
         self.ball_radius = 10
-        self.ball_center = [random.randint(180,220), random.randint(180,220)]
-        self.ball_velocity = [6,2]
+        self.ball_center = [self.rng.randint(180,220), self.rng.randint(180,220)]
+        self.ball_velocity = [6 * self.tick_scale, 2 * self.tick_scale]
         
         # These attributes help to maintain the scores for player A and B
         self.scoreA = 0
         self.scoreB = 0
+        # The score text keeps its font and each rendered value, so a score is only rendered when it changes.
+        self.score_text = HudText(None, 65, (255,255,255))
 
         # Finally, using the above attributes we create the paddles and the ball.
         self.paddleA = Paddle(self.surface, self.paddle1left, self.paddle1top, self.paddle1width, self.paddle1height)
         self.paddleB = Paddle(self.surface, self.paddle2left, self.paddle2top, self.paddle2width, self.paddle2height)
         self.ball = Ball(self.ball_radius, self.ball_center, self.ball_velocity, self.surface)
 
+        # The controllers decide every frame which way each paddle moves, and by how many pixels.
+        if controllerA is None:
+            controllerA = KeyboardController(pygame.K_q, pygame.K_a)
+        if controllerB is None:
+            controllerB = KeyboardController(pygame.K_p, pygame.K_l)
+        # A recorded game logs every change of direction.
+        if input_log is not None:
+            controllerA = RecordingController(controllerA, input_log, 0)
+            controllerB = RecordingController(controllerB, input_log, 1)
+        self.controllerA = controllerA
+        self.controllerB = controllerB
+        self.paddle_speed = 5 * self.tick_scale
+
+        # The time that has passed but that the physics has not stepped through yet,
+        # and whether the previous frame was rewinding.
+        self.accumulator = 0.0
+        self.rewinding = False
+
+        # The profiler times every frame, F3 shows its overlay.
+        self.profiler = FrameProfiler(PROFILE_PHASES)
+        # A FrameCapture copies every frame that is shown, if one is set.
+        self.capture = None
+
+        # The state after each of the latest physics steps, holding r plays them backwards.
+        self.history = RewindBuffer(10 * physics_rate, PongState)
+        # The state before the first step is the furthest back r can go. The buffer holds
+        # PongStates, so a subclass with a state of its own pushes its first one itself.
+        Game.snapshot(self, self.history.push())
+
+        # With a window, the ball, paddles and scores are dirty sprites drawn over a
+        # background that is made once, and only the rectangles they change are redrawn.
+        # They are drawn on self.surface, which is the window itself when it has the size
+        # of the field, and otherwise a backbuffer of that size that show() scales to the window.
+        self.sprites = None
+        self.dirty_rects = []
+        # rectangles of the window itself that changed, e.g. the bars beside the field
+        self.window_rects = []
+        if surface is not None:
+            self.background = pygame.Surface(WORLD_SIZE).convert()
+            self.background.fill(self.bg_color)
+            self.ball_sprite = BallSprite(self.ball)
+            self.scoreA_sprite = ScoreSprite(self.score_text, (10,10))
+            self.scoreB_sprite = ScoreSprite(self.score_text, (WORLD_SIZE[0] - 50,10))
+            self.sprites = pygame.sprite.LayeredDirty(PaddleSprite(self.paddleA), PaddleSprite(self.paddleB),
+                                                      self.ball_sprite, self.scoreA_sprite, self.scoreB_sprite)
+            self.sprites.clear(self.surface, self.background)
+            self.fit_window()
+
         
                  
     def play(self):
@@ -83,16 +228,53 @@ class Game: # Game class
         # - self is the Game that should be continued or not.
 
         while not self.close_clicked:  # until player clicks close box
-            # play frame
-            self.handle_events()
-
-            if self.continue_game:
-                self.draw()
+            # run at most with FPS Frames Per Second, the game's clock tells the time the frame took
+            elapsed = self.clock.frame(self.game_Clock.tick(self.FPS))
+            events = pygame.event.get()
+            self.play_frame(events, elapsed, pygame.key.get_pressed()[pygame.K_r])
+
+    def play_frame(self, events, elapsed, rewinding):
+        # Play one frame, timing each phase of it.
+        # - self is the Game
+        # - events is the list of this frame's pygame events
+        # - elapsed is the time in milliseconds since the previous frame
+        # - rewinding is True while the r key is held
+        profiler = self.profiler
+        # add the time the frame took to the time the physics has not stepped through yet
+        self.accumulator = min(self.accumulator + elapsed, self.max_catch_up_ms)
+
+        profiler.begin_frame()
+        for event in events:
+            self.handle_event(event)
+        profiler.mark(0)
+        if self.input_log is not None and rewinding != self.rewinding:
+            self.input_log.record(self.frame, REWIND, rewinding)
+        self.rewinding = rewinding
+
+        # run as many whole physics steps as that time holds, or step back as many while r is held
+        while (self.continue_game or rewinding) and self.accumulator >= self.step_ms:
+            if rewinding:
+                snapshot = self.history.pop()
+                if snapshot is not None:
+                    self.restore(snapshot)
+            else:
                 self.update()
+                profiler.mark(1)
                 self.decide_continue()
-                
-
-            self.game_Clock.tick(self.FPS) # run at most with FPS Frames Per Second 
+                profiler.mark(2)
+                self.snapshot(self.history.push())
+            self.accumulator -= self.step_ms
+
+        if self.continue_game:
+            # draw between the last two physics steps, as far as the leftover time goes
+            self.draw(self.accumulator / self.step_ms)
+            if profiler.visible:
+                self.dirty_rects.append(profiler.draw(self.surface))
+            profiler.mark(3)
+            self.show()
+            profiler.mark(4)
+        profiler.end_frame()
+        self.frame += 1
 
     def handle_events(self):
         # Handle each user event by changing the game state appropriately.
@@ -100,51 +282,123 @@ class Game: # Game class
 
         events = pygame.event.get()
         for event in events:
-            if event.type == pygame.QUIT:
-                self.close_clicked = True
-
-    def draw(self):
+            self.handle_event(event)
+
+    def handle_event(self, event):
+        # Change the game state for one event.
+        # - self is the Game
+        # - event is the pygame event
+        if event.type == pygame.QUIT:
+            self.close_clicked = True
+            if self.input_log is not None:
+                self.input_log.record(self.frame, QUIT)
+
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            # Show or hide the profiler overlay, the field under it is put back when it goes.
+            self.profiler.toggle()
+            if not self.profiler.visible:
+                self.repaint()
+
+        if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWSIZECHANGED):
+            # the window was uncovered or changed size, so the whole of it must be redrawn
+            self.fit_window()
+
+    def repaint(self):
+        # Draw the whole field again on the next frame.
+        # - self is the Game
+        if self.sprites is not None:
+            self.sprites.repaint_rect(self.surface.get_rect())
+
+    def fit_window(self):
+        # Work out where the field goes in the window, as big as it fits without
+        # changing its shape, and draw everything again on the next frame.
+        # - self is the Game
+        if self.window is None:
+            return
+        window_width, window_height = self.window.get_size()
+        scale = min(window_width / WORLD_SIZE[0], window_height / WORLD_SIZE[1])
+        self.viewport = pygame.Rect(0, 0, round(WORLD_SIZE[0] * scale), round(WORLD_SIZE[1] * scale))
+        self.viewport.center = (window_width // 2, window_height // 2)
+        self.scale = (self.viewport.width / WORLD_SIZE[0], self.viewport.height / WORLD_SIZE[1])
+        if self.surface is self.window and self.window.get_size() != WORLD_SIZE:
+            # the window no longer has the size of the field, so draw on a backbuffer from now on
+            self.surface = pygame.Surface(WORLD_SIZE).convert()
+        if self.surface is not self.window:
+            # the bars beside the field stay black, the scaled field is drawn into the viewport
+            self.window.fill(self.bg_color)
+            self.view = self.window.subsurface(self.viewport)
+        self.surface.blit(self.background, (0,0))
+        self.repaint()
+        self.window_rects.append(self.window.get_rect())
+
+    def to_window(self, rect):
+        # Return the window rectangle that a rectangle of the field is scaled to,
+        # rounded outwards so it covers every pixel the scaling touched.
+        # - self is the Game
+        # - rect is a pygame.Rect in world units
+        left = self.viewport.left + math.floor(rect.left * self.scale[0])
+        top = self.viewport.top + math.floor(rect.top * self.scale[1])
+        right = self.viewport.left + math.ceil(rect.right * self.scale[0])
+        bottom = self.viewport.top + math.ceil(rect.bottom * self.scale[1])
+        return pygame.Rect(left, top, right - left, bottom - top)
+
+    def describe(self):
+        # Return a short summary of the game, replays print it.
+        return 'score %d-%d after %d steps, ball at (%.1f, %.1f)' % (self.scoreA, self.scoreB, self.steps, self.ball_center[0], self.ball_center[1])
+
+    def draw(self, alpha=1.0):
         # Draw all game objects.
         # - self is the Game to draw
-
-        self.surface.fill(self.bg_color) # clear the display surface first
-        
-        # Draw the paddles
-        self.paddleA.draw()
-        self.paddleB.draw()
-        
-        # Draw the ball
-        self.ball.draw()
-        
-        # Update the ball as well, as per where is the position of it.
-        self.ball.update()
-        
-        # The following code helps represent the players score each time frame is updated
-        WHITE = (255,255,255)
-        font = pygame.font.Font(None, 65)
-        text = font.render(str(self.scoreA), 1, WHITE)
-        self.surface.blit(text, (10,10))
-        text = font.render(str(self.scoreB), 1, WHITE)
-        self.surface.blit(text, (350,10))        
-
-        pygame.display.update() # make the updated surface appear on the display
+        # - alpha is how far to draw between the previous and the current physics step, from 0 to 1
+
+        # A game without a window has nothing to draw.
+        if self.sprites is None:
+            return
+
+        # Move the sprites to where the paddles and the ball are, alpha of the way between
+        # the last two physics steps, and give the scores their values.
+        for sprite in self.sprites:
+            sprite.follow(alpha)
+        self.scoreA_sprite.show(self.scoreA)
+        self.scoreB_sprite.show(self.scoreB)
+
+        # Put the background back where the changed sprites were and draw them where they are now.
+        self.dirty_rects.extend(self.sprites.draw(self.surface))
+
+    def show(self):
+        # Make the changed parts of the drawn surface appear on the display.
+        # - self is the Game to show
+        if not self.dirty_rects and not self.window_rects:
+            return
+        if self.surface is self.window:
+            pygame.display.update(self.dirty_rects + self.window_rects)
+        else:
+            # the backbuffer is always the same size, so scaling it costs the same on any screen,
+            # and only the parts of the window that changed are sent to the display
+            pygame.transform.scale(self.surface, self.viewport.size, self.view)
+            pygame.display.update([self.to_window(rect) for rect in self.dirty_rects] + self.window_rects)
+        # the field is captured at its own size, however big the window is
+        if self.capture is not None:
+            self.capture.capture(self.surface, self.frame, self.clock.ticks())
+        self.dirty_rects.clear()
+        self.window_rects.clear()
 
     def update(self):
         # Update the game objects for the next frame.
         # - self is the Game to update
         
-        # The following code changes the position of the paddles as per the players input
-        # Notice we have used only if statements so that both players can play at the same time
-        keys = pygame.key.get_pressed()
-        
-        if keys[pygame.K_q]:
-            self.paddleA.moveUp(5)
-        if keys[pygame.K_a]:
-            self.paddleA.moveDown(5)
-        if keys[pygame.K_p]:
-            self.paddleB.moveUp(5)
-        if keys[pygame.K_l]:
-            self.paddleB.moveDown(5)
+        # Remember where everything was, drawing happens between that and the new positions.
+        self.ball.save_position()
+        self.paddleA.save_position()
+        self.paddleB.save_position()
+
+        # Update the ball first, as per where is the position of it.
+        self.ball.update()
+
+        # The following code changes the position of the paddles as per the controllers.
+        # Each controller answers -1 for up, 1 for down or 0 to stay, so both players can play at the same time
+        self.move_paddle(self.paddleA, self.controllerA.direction(self, self.paddleA))
+        self.move_paddle(self.paddleB, self.controllerB.direction(self, self.paddleB))
 
         # The following code detects the collision between the paddle and the ball.
         # Since the ball has to pass to through the paddles from the opposite sides, logically we know that for example
@@ -152,42 +406,168 @@ class Game: # Game class
         # through and we don't detect for collison unless so, we keep the condition when only if the ball meets the paddle A
         # from the right, then only detect for collision that is when horizontal component of velocity is less than 0.
         # We keep the same logic for paddle B except, here horizontal component of velocity should be greater than 0.
-        if self.ball_velocity[0] < 0:
-            
-            #This part of the code detects the collision. When I used collidepoint() I am considering the center of the ball as the point.
-            # However, I have included horizontal center of ball minus 10 since that is the ball's radius.
-            # In addition, I considered the vertical center of the ball for both plus and minus 10 since, the ball can hit the two paddles vertically
-            # from either the top or the bottom, unlike for the horizontal part.
-            if self.paddleA.collide(self.ball_center[0] - 10, self.ball_center[1] - 10) == True or self.paddleA.collide(self.ball_center[0] - 10, self.ball_center[1] + 10) == True:
-                self.ball_velocity[0] = -self.ball_velocity[0]
-                self.ball_velocity[1] = -random.randint(-2,3)
-            
-        if self.ball_velocity[0] > 0:
-            
-            if self.paddleB.collide(self.ball_center[0] + 10, self.ball_center[1] - 10) == True or self.paddleB.collide(self.ball_center[0] + 10, self.ball_center[1] + 10) == True:
-                self.ball_velocity[0] = -self.ball_velocity[0]
-                self.ball_velocity[1] = -random.randint(-2,3)
+        # The direction is taken from how the ball moved this step, since a wall may already have flipped its velocity.
+        motion = self.ball_center[0] - self.ball.previous_center[0]
+        if motion < 0:
+            self.bounce(self.paddleA, 1)
+        elif motion > 0:
+            self.bounce(self.paddleB, -1)
         
         # This code changes the scores based of whether that ball hits the edge of the opponents screen.    
         #if self.ball_center[0] >= pygame.display.get_surface().get_height() - self.ball_radius:
-        if self.ball_center[0] >= self.surface.get_height() - self.ball_radius:
+        if self.ball_center[0] >= WORLD_SIZE[0] - self.ball_radius:
             self.scoreA+=1
 
-        if self.ball_center[0] <= 10:
+        if self.ball_center[0] <= self.ball_radius:
             self.scoreB+=1
+
+        self.steps += 1
             
+    def snapshot(self, state):
+        # Copy the state of the game into a PongState and return it.
+        # - self is the Game
+        # - state is the PongState to write into
+        state.ball_x, state.ball_y = self.ball_center
+        state.velocity_x, state.velocity_y = self.ball_velocity
+        state.topA = self.paddleA.top
+        state.topB = self.paddleB.top
+        state.scoreA = self.scoreA
+        state.scoreB = self.scoreB
+        return state
+
+    def restore(self, state):
+        # Put the game back into the state saved in a PongState.
+        # - self is the Game
+        # - state is the PongState to read from
+        # The ball's lists are shared with the Game, so they are written in place.
+        self.ball_center[0] = state.ball_x
+        self.ball_center[1] = state.ball_y
+        self.ball_velocity[0] = state.velocity_x
+        self.ball_velocity[1] = state.velocity_y
+        self.paddleA.top = state.topA
+        self.paddleB.top = state.topB
+        self.scoreA = state.scoreA
+        self.scoreB = state.scoreB
+        # Nothing moved in between, so there is nothing to draw in between either.
+        self.ball.save_position()
+        self.paddleA.save_position()
+        self.paddleB.save_position()
+        self.continue_game = self.scoreA < self.winning_score and self.scoreB < self.winning_score
+
+    def bounce(self, paddle, away):
+        # Bounce the ball off a paddle if its path over this step runs into it.
+        # - self is the Game
+        # - paddle is the Paddle to check
+        # - away is 1 if the paddle sends the ball to the right and -1 to the left
+        # Testing the whole path instead of the end point means a fast ball can't jump through a paddle.
+        start = self.ball.previous_center
+        end = self.ball_center
+        t = paddle.sweep(start, end, self.ball_radius)
+        if t is None:
+            return False
+
+        # Move the ball back to where it touched the paddle and send the rest of this step's
+        # horizontal movement the other way.
+        touch_x = start[0] + (end[0] - start[0]) * t
+        self.ball_center[0] = touch_x - (end[0] - start[0]) * (1 - t)
+        self.ball_velocity[0] = away * abs(self.ball_velocity[0])
+        self.ball_velocity[1] = -self.rng.randint(-2,3) * self.tick_scale
+        return True
+
+    def move_paddle(self, paddle, direction):
+        # Move a paddle the way its controller asked.
+        # - self is the Game
+        # - paddle is the Paddle to move
+        # - direction is -1 to move up, 1 to move down and 0 to stay
+        if direction < 0:
+            paddle.moveUp(self.paddle_speed)
+        elif direction > 0:
+            paddle.moveDown(self.paddle_speed)
+
     def decide_continue(self):
         # Check and remember if the game should continue
         # - self is the Game to check
 
-        if self.scoreA == 11 or self.scoreB == 11 :
+        if self.scoreA >= self.winning_score or self.scoreB >= self.winning_score:
             self.draw()
+            self.show()
             self.update()            
             self.continue_game = False    
 
+class KeyboardController: # KeyboardController class
+    # An object in this class moves a paddle with two keys of the keyboard
+
+    def __init__(self, up_key, down_key):
+        # Initialize a KeyboardController.
+        # - self is the KeyboardController to initialize
+        # - up_key and down_key are the pygame key constants that move the paddle
+        self.up_key = up_key
+        self.down_key = down_key
+
+    def direction(self, game, paddle):
+        # Return which way the paddle should move: -1 up, 1 down or 0.
+        # Holding both keys cancels out, just like moving up and then down again.
+        keys = pygame.key.get_pressed()
+        return keys[self.down_key] - keys[self.up_key]
+
+
+class RecordingController: # RecordingController class
+    # An object in this class asks another controller which way to move and
+    # logs every change of direction, so the game can be played again.
+
+    def __init__(self, controller, input_log, index):
+        # - controller is the controller that really moves the paddle
+        # - input_log is the InputLog the changes are recorded to
+        # - index is 0 for paddle A and 1 for paddle B
+        self.controller = controller
+        self.input_log = input_log
+        self.index = index
+        self.last = 0
+
+    def direction(self, game, paddle):
+        direction = self.controller.direction(game, paddle)
+        if direction != self.last:
+            self.input_log.record(game.steps, PADDLE, self.index, direction)
+            self.last = direction
+        return direction
+
+
+class ReplayController: # ReplayController class
+    # An object in this class moves a paddle the way a recorded session did.
+
+    def __init__(self, input_log, index):
+        # - input_log is the InputLog of the recorded session
+        # - index is 0 for paddle A and 1 for paddle B
+        self.moves = input_log.paddle_moves(index)
+        self.next = 0
+        self.current = 0
+
+    def direction(self, game, paddle):
+        # take every change logged up to the game's current physics step
+        while self.next < len(self.moves) and self.moves[self.next][0] <= game.steps:
+            self.current = self.moves[self.next][1]
+            self.next += 1
+        return self.current
+
+
+class PongState: # PongState class
+    # An object in this class holds the whole state of a game in eight numbers,
+    # small enough to save after every physics step.
+
+    __slots__ = ('ball_x', 'ball_y', 'velocity_x', 'velocity_y', 'topA', 'topB', 'scoreA', 'scoreB')
+
+    def __init__(self):
+        self.ball_x = self.ball_y = 0.0
+        self.velocity_x = self.velocity_y = 0.0
+        self.topA = self.topB = 0
+        self.scoreA = self.scoreB = 0
+
+
 class Ball: # Ball class
     # An object in this class represents a Ball that moves 
 
+    __slots__ = ('color', 'radius', 'center', 'velocity', 'surface', 'previous_center')
+
     def __init__(self, ball_radius, ball_center, ball_velocity, surface):
         # Initialize a Ball.
         # - self is the Ball to initialize
@@ -202,6 +582,12 @@ class Ball: # Ball class
         self.center = ball_center
         self.velocity = ball_velocity
         self.surface = surface
+        # The center at the previous physics step, used to draw in between steps
+        self.previous_center = list(ball_center)
+
+    def save_position(self):
+        # Remember the current center as the previous one
+        self.previous_center[:] = self.center
 
     def update(self):
         
@@ -214,22 +600,95 @@ class Ball: # Ball class
         # change the velocity by making it negative, for both the components
 
         for i in range(0,2):
-            if self.center[i] >= 390:
+            if self.center[i] >= WORLD_SIZE[i] - self.radius:
                 self.velocity[i] = -self.velocity[i]
                 
-            if self.center[i] <= 10:
+            if self.center[i] <= self.radius:
                 self.velocity[i] = -self.velocity[i]
 
-    def draw(self):
+    def draw(self, alpha=1.0):
         # Draw the ball on the surface
         # - self is the Ball
+        # - alpha is how far to draw between the previous and the current center
         
-        pygame.draw.circle(self.surface, self.color, self.center, self.radius)
+        center = [self.previous_center[i] + (self.center[i] - self.previous_center[i]) * alpha for i in range(0,2)]
+        pygame.draw.circle(self.surface, self.color, center, self.radius)
+
+
+class BallSprite(pygame.sprite.DirtySprite): # BallSprite class
+    # An object in this class draws a Ball as a dirty sprite
+
+    def __init__(self, ball):
+        # - ball is the Ball to draw
+        pygame.sprite.DirtySprite.__init__(self)
+        self.ball = ball
+        size = 2 * ball.radius
+        self.image = pygame.Surface((size, size)).convert()
+        self.image.set_colorkey((0, 0, 0))
+        pygame.draw.circle(self.image, ball.color, (ball.radius, ball.radius), ball.radius)
+        self.rect = self.image.get_rect()
+
+    def follow(self, alpha):
+        # Move to the ball's position alpha of the way from its previous center, if it moved.
+        ball = self.ball
+        x = round(ball.previous_center[0] + (ball.center[0] - ball.previous_center[0]) * alpha)
+        y = round(ball.previous_center[1] + (ball.center[1] - ball.previous_center[1]) * alpha)
+        if (x, y) != self.rect.center:
+            self.rect.center = (x, y)
+            self.dirty = 1
+
+
+class PaddleSprite(pygame.sprite.DirtySprite): # PaddleSprite class
+    # An object in this class draws a Paddle as a dirty sprite
+
+    def __init__(self, paddle):
+        # - paddle is the Paddle to draw
+        pygame.sprite.DirtySprite.__init__(self)
+        self.paddle = paddle
+        self.image = pygame.Surface((paddle.width, paddle.height)).convert()
+        self.image.fill(paddle.color)
+        self.rect = self.image.get_rect(left=paddle.left, top=round(paddle.top))
+
+    def follow(self, alpha):
+        # Move to the paddle's top alpha of the way from its previous top, if it moved.
+        paddle = self.paddle
+        top = round(paddle.previous_top + (paddle.top - paddle.previous_top) * alpha)
+        if top != self.rect.top:
+            self.rect.top = top
+            self.dirty = 1
+
+
+class ScoreSprite(pygame.sprite.DirtySprite): # ScoreSprite class
+    # An object in this class shows a score, it only changes when the score does
+
+    def __init__(self, score_text, position, align='topleft'):
+        # - score_text is the HudText that renders the score
+        # - position is where the score goes
+        # - align is the corner of the score that is put at position, e.g. 'topright'
+        pygame.sprite.DirtySprite.__init__(self)
+        self.score_text = score_text
+        self.position = position
+        self.align = align
+        self.value = None
+        self.show(0)
+
+    def show(self, value):
+        if value != self.value:
+            self.value = value
+            self.image = self.score_text.render(value)
+            self.rect = self.image.get_rect(**{self.align: self.position})
+            self.dirty = 1
+
+    def follow(self, alpha):
+        pass
 
 
 class Paddle: # Let us now make the paddle class
     
     # An object here represents the paddle that moves
+
+    __slots__ = ('surface', 'color', 'left', 'top', 'width', 'height', 'previous_top')
+
     def __init__(self, surface, left, top, width, height):
         
         # Initialize a paddle.
@@ -245,6 +704,12 @@ class Paddle: # Let us now make the paddle class
         self.top = top
         self.width = width
         self.height = height
+        # The top at the previous physics step, used to draw in between steps
+        self.previous_top = top
+
+    def save_position(self):
+        # Remember the current top as the previous one
+        self.previous_top = self.top
     
     # This code helps to move the paddles up based on input called pixels    
     def moveUp(self, pixels):
@@ -257,18 +722,45 @@ class Paddle: # Let us now make the paddle class
     def moveDown(self, pixels):
         self.top += pixels
         #Check that you are not going too far (off the screen)
-        if self.top > 350:
-            self.top = 350
+        if self.top > WORLD_SIZE[1] - self.height:
+            self.top = WORLD_SIZE[1] - self.height
 
-    def draw(self):
+    def draw(self, alpha=1.0):
 
-        # We use the pygame.draw.rect() function to draw the paddles as rectangles.
-        pygame.draw.rect(self.surface, self.color, pygame.Rect(self.left, self.top, self.width, self.height))
+        # We use the pygame.draw.rect() function to draw the paddles as rectangles,
+        # alpha of the way from the previous top to the current one.
+        top = self.previous_top + (self.top - self.previous_top) * alpha
+        pygame.draw.rect(self.surface, self.color, pygame.Rect(self.left, top, self.width, self.height))
         
+    def sweep(self, start, end, radius):
+        # Return how far along the path from start to end (0 to 1) a ball of the given radius
+        # first touches the paddle, or None if it misses.
+        # The paddle is widened by the radius on every side, so the ball can be treated as its center point,
+        # and the path is clipped against that rectangle one axis at a time.
+        lows = (self.left - radius, self.top - radius)
+        highs = (self.left + self.width + radius, self.top + self.height + radius)
+        t_enter = 0.0
+        t_exit = 1.0
+        for i in range(0,2):
+            distance = end[i] - start[i]
+            if distance == 0:
+                # not moving along this axis, so the ball must already be between the sides
+                if start[i] < lows[i] or start[i] > highs[i]:
+                    return None
+                continue
+            t_low = (lows[i] - start[i]) / distance
+            t_high = (highs[i] - start[i]) / distance
+            t_enter = max(t_enter, min(t_low, t_high))
+            t_exit = min(t_exit, max(t_low, t_high))
+            if t_enter > t_exit:
+                return None
+        return t_enter
+
     def collide(self, pointx, pointy):
         
         # We use the collidpoint() function to help detect collision of a point with the paddles.
         return pygame.Rect(self.left, self.top, self.width, self.height).collidepoint(pointx, pointy)
         
 
-main()
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Performance measurements for both games, run with python -m benchmarks.frames
@@ -0,0 +1,220 @@
+import os, sys, time, json, random, argparse, tracemalloc
+
+# run without a window unless a real video driver was asked for
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from common.startup import init_pygame
+import Memory
+import Pong
+from Pong.headless import TrackingController, RandomController
+
+
+# The timed phases of a frame, in the order play() runs them
+PHASES = ('handle_events', 'update', 'draw', 'flip')
+
+# Where the baseline is kept, next to this file
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Differences smaller than this many milliseconds are noise, not regressions
+NOISE_MS = 0.05
+
+
+class MemoryBench:
+    # An object in this class plays Memory with scripted clicks
+
+    name = 'memory'
+    window_size = Memory.WINDOW_SIZE
+
+    def __init__(self, rng, click_every=10):
+        # - rng is the random.Random the clicks are chosen with
+        # - click_every is how many frames pass between two clicks
+        self.rng = rng
+        self.click_every = click_every
+
+    def new_game(self, surface):
+        # the benchmark times the polling loop's frames, one phase at a time
+        return Memory.Game(surface, event_driven=False, seed=self.rng.getrandbits(64))
+
+    def phases(self, game):
+        # the same calls as Memory.Game.play(), one callable per phase
+        def update():
+            game.update()
+            game.decide_continue()
+        return (game.handle_events, update, game.draw, game.dirty_rects.update)
+
+    def end_game(self, game):
+        # stop the game's image loader thread
+        game.close()
+
+    def before_frame(self, game, frame):
+        # click on a random tile every click_every frames
+        if frame % self.click_every == 0:
+            tile = self.rng.choice(self.rng.choice(game.board))
+            position = (int(tile.x + tile.width / 2), int(tile.y + tile.height / 2))
+            pygame.event.post(pygame.event.Event(pygame.MOUSEBUTTONUP, pos=position, button=1))
+
+
+class PongBench:
+    # An object in this class plays Pong with one tracking and one random paddle
+
+    name = 'pong'
+    window_size = Pong.WINDOW_SIZE
+
+    def __init__(self, rng):
+        # - rng is the random.Random the random paddle moves with
+        self.rng = rng
+
+    def new_game(self, surface):
+        return Pong.Game(surface, TrackingController(), RandomController(self.rng), seed=self.rng.getrandbits(64))
+
+    def phases(self, game):
+        # one physics step per frame, like Pong.Game.play() when both run at 60 per second
+        def update():
+            game.update()
+            game.decide_continue()
+        return (game.handle_events, update, game.draw, game.show)
+
+    def end_game(self, game):
+        pass
+
+    def before_frame(self, game, frame):
+        pass
+
+
+def percentile(values, fraction):
+    # Return the value below which the given fraction of the sorted values lie.
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(milliseconds):
+    # Return the p50, p95 and p99 of a list of frame times in milliseconds.
+    ordered = sorted(milliseconds)
+    return {'p50': percentile(ordered, 0.50), 'p95': percentile(ordered, 0.95), 'p99': percentile(ordered, 0.99)}
+
+
+def run_frames(bench, surface, frames, measure):
+    # Play frames frames of a game, starting a new one whenever it ends, and
+    # call measure(phases) to run each frame.
+    game = bench.new_game(surface)
+    phases = bench.phases(game)
+    for frame in range(frames):
+        if not game.continue_game:
+            bench.end_game(game)
+            game = bench.new_game(surface)
+            phases = bench.phases(game)
+        bench.before_frame(game, frame)
+        measure(phases)
+    bench.end_game(game)
+
+
+def bench_game(bench, frames):
+    # Time every phase of frames frames of a game, then count the memory
+    # allocated per frame in a second, untimed pass.
+    surface = pygame.display.set_mode(bench.window_size)
+    times = {phase: [] for phase in PHASES}
+    totals = []
+    clock = time.perf_counter_ns
+
+    def timed(phases):
+        frame_start = clock()
+        for phase, call in zip(PHASES, phases):
+            start = clock()
+            call()
+            times[phase].append((clock() - start) / 1e6)
+        totals.append((clock() - frame_start) / 1e6)
+
+    run_frames(bench, surface, frames, timed)
+
+    # tracemalloc slows everything down, so the allocations get a pass of their own
+    allocated = []
+    blocks = []
+
+    def traced(phases):
+        # clearing the traces zeroes both the traced total and its peak, so the
+        # peak is what this frame allocated (reset_peak() would need Python 3.9)
+        tracemalloc.clear_traces()
+        before_blocks = sys.getallocatedblocks()
+        for call in phases:
+            call()
+        allocated.append(tracemalloc.get_traced_memory()[1])
+        blocks.append(sys.getallocatedblocks() - before_blocks)
+
+    tracemalloc.start()
+    try:
+        run_frames(bench, surface, min(frames, 500), traced)
+    finally:
+        tracemalloc.stop()
+
+    result = {'frames': frames, 'frame': summarize(totals)}
+    for phase in PHASES:
+        result[phase] = summarize(times[phase])
+    result['alloc_bytes_per_frame'] = sum(allocated) / len(allocated)
+    result['net_blocks_per_frame'] = sum(blocks) / len(blocks)
+    return result
+
+
+def compare(results, baseline, tolerance):
+    # Return a list of messages for every percentile that got slower than the
+    # baseline by more than tolerance (a fraction) and the noise floor.
+    regressions = []
+    for game, result in results.items():
+        if game not in baseline:
+            continue
+        for phase in ('frame',) + PHASES:
+            for key in ('p50', 'p95', 'p99'):
+                old = baseline[game][phase][key]
+                new = result[phase][key]
+                if new > old * (1 + tolerance) and new - old > NOISE_MS:
+                    regressions.append('%s %s %s: %.3f ms -> %.3f ms (+%.0f%%)' % (game, phase, key, old, new, (new / old - 1) * 100 if old else float('inf')))
+    return regressions
+
+
+def report(results):
+    # Print a table of the results.
+    print('%-8s %-14s %9s %9s %9s' % ('game', 'phase', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for game, result in results.items():
+        for phase in ('frame',) + PHASES:
+            stats = result[phase]
+            print('%-8s %-14s %9.3f %9.3f %9.3f' % (game, phase, stats['p50'], stats['p95'], stats['p99']))
+        print('%-8s %.0f bytes allocated and %+.1f blocks kept per frame' % (game, result['alloc_bytes_per_frame'], result['net_blocks_per_frame']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the frames of both games under the SDL dummy driver.')
+    parser.add_argument('--frames', type=int, default=3000, help='frames to time per game')
+    parser.add_argument('--games', nargs='+', choices=('memory', 'pong'), default=['memory', 'pong'])
+    parser.add_argument('--seed', type=int, default=0, help='seed for the scripted input')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file to compare with')
+    parser.add_argument('--save', action='store_true', help='save these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='allowed slowdown as a fraction of the baseline')
+    args = parser.parse_args(argv)
+
+    init_pygame()
+    rng = random.Random(args.seed)
+    benches = {'memory': MemoryBench(rng), 'pong': PongBench(rng)}
+    results = {}
+    for name in args.games:
+        results[name] = bench_game(benches[name], args.frames)
+    pygame.quit()
+    report(results)
+
+    status = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION ' + regression)
+        if regressions:
+            status = 1
+    if args.save:
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print('saved baseline to %s' % args.baseline)
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
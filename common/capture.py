@@ -0,0 +1,251 @@
+import pygame, struct, json, queue, threading, subprocess, zlib, os, sys, argparse
+
+
+# The environment variable naming the file a game captures its frames to, or
+# an encoder command to pipe them to when it starts with |, e.g.
+# GAME_CAPTURE='|ffmpeg -f rawvideo -pix_fmt {pix_fmt} -s {width}x{height} -r 60 -i - out.mp4'
+CAPTURE_VARIABLE = 'GAME_CAPTURE'
+
+# A frame archive starts with MAGIC, then the length of a JSON header and the
+# header itself, then one FRAME record and the zlib compressed pixels per frame:
+# the frame number, the game's time in milliseconds and the compressed length
+MAGIC = b'GCAP'
+HEADER_LENGTH = struct.Struct('<I')
+FRAME = struct.Struct('<IdI')
+
+# How many frames may wait for the writer before new ones are dropped
+QUEUE_LENGTH = 8
+
+
+def pixel_format(masks):
+    # Return the ffmpeg name of a 32 bit pixel format with the given color
+    # masks, e.g. 'bgr0' for the usual display format on a little endian machine.
+    letters = []
+    for byte in range(4):
+        shift = 8 * byte if sys.byteorder == 'little' else 8 * (3 - byte)
+        letter = '0'
+        for name, mask in zip('rgba', masks):
+            if mask == 0xff << shift:
+                letter = name
+        letters.append(letter)
+    return ''.join(letters)
+
+
+class ArchiveSink:
+    # An object in this class writes frames to a frame archive, each one
+    # compressed on its own so a frame can be read without the ones before it.
+
+    def __init__(self, path, level=1):
+        # - path is the archive file to write
+        # - level is the zlib compression level, low levels keep up with a game best
+        self.path = path
+        self.level = level
+        self.file = None
+
+    def open(self, header):
+        self.file = open(self.path, 'wb')
+        header = json.dumps(header).encode('utf-8')
+        self.file.write(MAGIC)
+        self.file.write(HEADER_LENGTH.pack(len(header)))
+        self.file.write(header)
+
+    def write(self, frame, ms, pixels):
+        data = zlib.compress(pixels, self.level)
+        self.file.write(FRAME.pack(frame, ms, len(data)))
+        self.file.write(data)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class PipeSink:
+    # An object in this class writes the raw pixels of every frame to the
+    # standard input of an encoder, which compresses them itself.
+
+    def __init__(self, command):
+        # - command is the shell command to run, {width}, {height} and {pix_fmt}
+        #   in it are replaced by the frame size and pixel format
+        self.command = command
+        self.process = None
+
+    def open(self, header):
+        command = self.command.format(**header)
+        self.process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE)
+
+    def write(self, frame, ms, pixels):
+        self.process.stdin.write(pixels)
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+class FrameCapture:
+    # An object in this class records the frames a game draws without slowing
+    # it down. The game thread copies each finished frame straight out of the
+    # surface's pixel buffer into one of a few buffers that are made up front,
+    # which allocates and converts nothing. A writer thread of its own
+    # compresses and writes the buffers and hands them back. When every buffer
+    # is still waiting for the writer the frame is dropped and counted, so the
+    # game never waits for the disk or the encoder.
+
+    def __init__(self, surface, sink, queue_length=QUEUE_LENGTH):
+        # Initialize a FrameCapture and start its thread.
+        # - self is the FrameCapture to initialize
+        # - surface is the surface the game draws its frames on, or one of the
+        #   same size and format
+        # - sink is the ArchiveSink or PipeSink the frames are written to
+        # - queue_length is how many frames may wait for the writer
+        if surface.get_bytesize() != 4:
+            raise ValueError('only 32 bit surfaces can be captured')
+        self.size = surface.get_size()
+        self.masks = surface.get_masks()
+        self.sink = sink
+        self.row_bytes = 4 * self.size[0]
+        self.frame_bytes = self.row_bytes * self.size[1]
+        # the buffers that are free to copy a frame into, and the frames that wait
+        # for the writer, which has room for the None that stops the thread too
+        self.free = queue.Queue()
+        for buffer in range(queue_length):
+            self.free.put(bytearray(self.frame_bytes))
+        self.waiting = queue.Queue(queue_length + 1)
+        # these keep count of the frames, and hold what the writer raised, if anything
+        self.captured = 0
+        self.dropped = 0
+        self.written = 0
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='frame-capture', daemon=True)
+        self.thread.start()
+
+    def capture(self, surface, frame, ms):
+        # Copy a finished frame for the writer and return True, or drop it and
+        # return False if the writer is behind.
+        # - self is the FrameCapture
+        # - surface is the surface the frame was drawn on
+        # - frame is the game's frame number
+        # - ms is the game's time in milliseconds
+        if surface.get_size() != self.size or surface.get_masks() != self.masks:
+            raise ValueError('captured surfaces must all have the same size and format')
+        try:
+            buffer = self.free.get_nowait()
+        except queue.Empty:
+            self.dropped += 1
+            return False
+        view = surface.get_buffer()
+        pitch = surface.get_pitch()
+        if pitch == self.row_bytes:
+            buffer[:] = view
+        else:
+            # the rows of the surface are padded, so they are copied one at a time,
+            # straight from the surface's memory without a copy of the whole of it
+            with memoryview(view) as pixels:
+                for row in range(self.size[1]):
+                    buffer[row * self.row_bytes:(row + 1) * self.row_bytes] = pixels[row * pitch:row * pitch + self.row_bytes]
+        # the surface stays locked until the buffer proxy is gone
+        del view
+        self.captured += 1
+        self.waiting.put_nowait((frame, ms, buffer))
+        return True
+
+    def run(self): # this method is the writer thread, it writes frames until close() is called
+        header = {'width': self.size[0], 'height': self.size[1], 'masks': list(self.masks),
+                  'pix_fmt': pixel_format(self.masks)}
+        try:
+            self.sink.open(header)
+        except Exception as error:
+            self.error = error
+        while True:
+            item = self.waiting.get()
+            if item is None:
+                break
+            frame, ms, buffer = item
+            if self.error is None:
+                try:
+                    self.sink.write(frame, ms, buffer)
+                    self.written += 1
+                except Exception as error:
+                    # the error is raised in the game's thread by close(), frames
+                    # are only handed back from now on so the game goes on
+                    self.error = error
+            self.free.put(buffer)
+        self.sink.close()
+
+    def close(self): # this method writes the frames still waiting and stops the thread
+        self.waiting.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def report(self):
+        # Return a one line summary of the frames captured, written and dropped.
+        return 'captured %d frames, wrote %d, dropped %d' % (self.captured, self.written, self.dropped)
+
+
+def capture_from_env(surface):
+    # Return a new FrameCapture of surface if the CAPTURE_VARIABLE environment
+    # variable names a file or a command to capture to, otherwise None.
+    target = os.environ.get(CAPTURE_VARIABLE)
+    if not target or surface is None:
+        return None
+    if target.startswith('|'):
+        return FrameCapture(surface, PipeSink(target[1:]))
+    return FrameCapture(surface, ArchiveSink(target))
+
+
+def close_capture(capture):
+    # Finish a capture made by capture_from_env() and print what it did.
+    if capture is not None:
+        capture.close()
+        print(capture.report())
+
+
+def read_archive(path):
+    # Return the header of a frame archive and a generator of its
+    # (frame, ms, pixels) frames.
+    archive = open(path, 'rb')
+    if archive.read(len(MAGIC)) != MAGIC:
+        archive.close()
+        raise ValueError('%s is not a frame archive' % path)
+    length, = HEADER_LENGTH.unpack(archive.read(HEADER_LENGTH.size))
+    header = json.loads(archive.read(length).decode('utf-8'))
+
+    def frames():
+        with archive:
+            while True:
+                record = archive.read(FRAME.size)
+                if len(record) < FRAME.size:
+                    return
+                frame, ms, length = FRAME.unpack(record)
+                yield frame, ms, zlib.decompress(archive.read(length))
+
+    return header, frames()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Show what a frame archive holds, or turn its frames into images.')
+    parser.add_argument('archive', help='the frame archive')
+    parser.add_argument('--images', metavar='DIRECTORY', help='write every frame to DIRECTORY as frame_NNNNNN.png')
+    args = parser.parse_args(argv)
+
+    header, frames = read_archive(args.archive)
+    size = (header['width'], header['height'])
+    surface = pygame.Surface(size, 0, 32, header['masks'])
+    if args.images:
+        os.makedirs(args.images, exist_ok=True)
+    count = 0
+    first = last = None
+    for frame, ms, pixels in frames:
+        if args.images:
+            surface.get_buffer().write(pixels)
+            pygame.image.save(surface, os.path.join(args.images, 'frame_%06d.png' % frame))
+        count += 1
+        first = ms if first is None else first
+        last = ms
+    print('%s: %d frames of %dx%d over %.1f s' % (args.archive, count, size[0], size[1], (last - first) / 1000 if count else 0))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import pygame, collections
+
+
+# The fonts already created, keyed by (name, size, system). Looking a font
+# up (especially a SysFont) is slow, so each one is only ever made once.
+_fonts = {}
+
+
+def get_font(name, size, system=False):
+    # Return the font with the given name and size, creating it on first use.
+    # - name is the font name (None or '' for the default font)
+    # - size is the font size in points
+    # - system is True to look the font up with SysFont instead of Font
+    key = (name, size, system)
+    font = _fonts.get(key)
+    if font is None:
+        if system:
+            font = pygame.font.SysFont(name, size)
+        else:
+            font = pygame.font.Font(name, size)
+        _fonts[key] = font
+    return font
+
+
+class HudText:
+    # An object in this class renders short HUD strings such as scores and
+    # keeps the rendered surfaces, so a value is only rendered once.
+
+    def __init__(self, name, size, color, background=None, system=False, max_entries=128):
+        # Initialize a HudText.
+        # - self is the HudText to initialize
+        # - name, size and system select the font, see get_font()
+        # - color is the text color and background the optional fill color
+        # - max_entries is how many rendered strings are kept before the
+        #   least recently used one is dropped
+        self.name = name
+        self.size = size
+        self.system = system
+        self.color = pygame.Color(color)
+        self.background = None if background is None else pygame.Color(background)
+        self.max_entries = max_entries
+        # the rendered surfaces, the least recently used one first
+        self.surfaces = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, value):
+        # Return the surface showing value, rendering it only if it is new.
+        # - self is the HudText
+        # - value is anything that can be turned into a str
+        text = str(value)
+        surface = self.surfaces.get(text)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(text)
+            return surface
+
+        self.misses += 1
+        font = get_font(self.name, self.size, self.system)
+        if self.background is None:
+            surface = font.render(text, True, self.color)
+        else:
+            surface = font.render(text, True, self.color, self.background)
+        self.surfaces[text] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
@@ -0,0 +1,134 @@
+import pygame, time, array, csv, signal
+
+from common.hud import get_font
+
+
+# The frame time the games aim for at 60 frames per second, in milliseconds
+FRAME_BUDGET_MS = 1000 / 60
+
+# The environment variable naming the CSV file the games write their frame profile to
+PROFILE_CSV_VARIABLE = 'GAME_PROFILE_CSV'
+
+
+class FrameProfiler:
+    # An object in this class records how long every phase of each frame took
+    # in a fixed size ring buffer, can draw them as an overlay and can write
+    # them to a CSV file. Recording a phase is one clock read and one add.
+
+    def __init__(self, phases, capacity=600, csv_path=None):
+        # Initialize a FrameProfiler.
+        # - self is the FrameProfiler to initialize
+        # - phases is the list of phase names, in the order a frame runs them
+        # - capacity is how many of the most recent frames are kept
+        # - csv_path is the file close() and the dump signal write to, or None
+        self.phases = tuple(phases)
+        self.capacity = capacity
+        self.csv_path = csv_path
+        # one row of phase durations in milliseconds per frame, all rows in one flat array
+        self.durations = array.array('d', bytes(8 * capacity * len(self.phases)))
+        # the row of the frame being recorded, and how many frames were recorded in total
+        self.row = 0
+        self.frames = 0
+        self.last = 0.0
+        # the overlay is toggled with a hotkey, see toggle()
+        self.visible = False
+        self.dump_requested = False
+
+    def begin_frame(self):
+        # Start recording a new frame, clearing the oldest one in the buffer.
+        start = self.row * len(self.phases)
+        for i in range(start, start + len(self.phases)):
+            self.durations[i] = 0.0
+        self.last = time.perf_counter()
+
+    def mark(self, phase):
+        # Add the time since the previous mark to a phase of this frame.
+        # - phase is the index of the phase in self.phases
+        now = time.perf_counter()
+        self.durations[self.row * len(self.phases) + phase] += (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self):
+        # Finish the frame, and write the buffer out if a signal asked for it.
+        self.row = (self.row + 1) % self.capacity
+        self.frames += 1
+        if self.dump_requested:
+            self.dump_requested = False
+            if self.csv_path is not None:
+                self.dump_csv(self.csv_path)
+
+    def recorded(self):
+        # Return the recorded frames, oldest first, each as a tuple of phase durations.
+        count = min(self.frames, self.capacity)
+        first = (self.row - count) % self.capacity
+        width = len(self.phases)
+        rows = []
+        for i in range(count):
+            start = (first + i) % self.capacity * width
+            rows.append(tuple(self.durations[start:start + width]))
+        return rows
+
+    def worst_phases(self, count=2):
+        # Return the count phases with the longest single frame time as (name, milliseconds).
+        rows = self.recorded()
+        if not rows:
+            return []
+        worst = [(max(row[i] for row in rows), name) for i, name in enumerate(self.phases)]
+        worst.sort(reverse=True)
+        return [(name, ms) for ms, name in worst[:count]]
+
+    def dump_csv(self, path):
+        # Write every recorded frame to a CSV file, one row per frame.
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(('frame', 'total_ms') + self.phases)
+            first = self.frames - min(self.frames, self.capacity)
+            for number, row in enumerate(self.recorded(), first):
+                writer.writerow([number, '%.4f' % sum(row)] + ['%.4f' % ms for ms in row])
+
+    def watch_signal(self, signum=getattr(signal, 'SIGUSR1', None)):
+        # Write the buffer to csv_path at the end of the frame in which the signal arrives.
+        # There is no SIGUSR1 on Windows, so nothing is watched there.
+        if signum is not None:
+            signal.signal(signum, self.request_dump)
+
+    def request_dump(self, signum=None, frame=None):
+        self.dump_requested = True
+
+    def close(self):
+        # Write the buffer to csv_path, if there is one, when the game ends.
+        if self.csv_path is not None and self.frames:
+            self.dump_csv(self.csv_path)
+
+    def toggle(self):
+        # Show or hide the overlay.
+        self.visible = not self.visible
+
+    def draw(self, surface, width=200, height=90):
+        # Draw the overlay at the bottom left of the surface and return its rectangle.
+        # It shows a graph of the latest frame times, with a line at the frame budget,
+        # and the phases with the worst frame times.
+        rect = pygame.Rect(0, surface.get_height() - height, width, height)
+        surface.fill((0, 0, 0), rect)
+        pygame.draw.rect(surface, (90, 90, 90), rect, 1)
+
+        # one pixel column per frame, the graph's top is two frame budgets
+        graph_top = rect.top + 40
+        graph_height = rect.bottom - 2 - graph_top
+        scale = graph_height / (2 * FRAME_BUDGET_MS)
+        rows = self.recorded()[-(width - 4):]
+        for x, row in enumerate(rows, rect.left + 2):
+            total = sum(row)
+            color = (90, 220, 90) if total <= FRAME_BUDGET_MS else (230, 70, 70)
+            bar = min(graph_height, int(total * scale))
+            pygame.draw.line(surface, color, (x, rect.bottom - 2), (x, rect.bottom - 2 - bar))
+        budget_y = rect.bottom - 2 - int(FRAME_BUDGET_MS * scale)
+        pygame.draw.line(surface, (200, 200, 80), (rect.left + 1, budget_y), (rect.right - 2, budget_y))
+
+        font = get_font(None, 18)
+        last = sum(rows[-1]) if rows else 0.0
+        lines = ['frame %.2f ms' % last]
+        lines.append('  '.join('%s %.1f' % worst for worst in self.worst_phases()))
+        for i, line in enumerate(lines):
+            surface.blit(font.render(line, True, (230, 230, 230)), (rect.left + 4, rect.top + 4 + 16 * i))
+        return rect
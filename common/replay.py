@@ -0,0 +1,166 @@
+import struct, json, random, time, os, sys, importlib, argparse
+
+
+# The environment variable naming the file a game records its session to
+RECORD_VARIABLE = 'GAME_RECORD'
+
+# A log file starts with MAGIC, then the length of a JSON header and the
+# header itself, then one RECORD per input event
+MAGIC = b'GLOG'
+HEADER_LENGTH = struct.Struct('<I')
+RECORD = struct.Struct('<IBhh')
+
+# The kinds of input events, each with two small numbers:
+# CLICK x, y - a mouse button went up at (x, y)
+# KEY key, 0 - a key was pressed
+# PADDLE paddle, direction - a paddle's controller changed direction; these
+#     are logged at the game's physics step count instead of its frame, since
+#     a controller can change its mind between two steps of the same frame
+# REWIND held, 0 - the rewind key was pressed or released
+# QUIT 0, 0 - the window was closed
+CLICK, KEY, PADDLE, REWIND, QUIT = range(1, 6)
+
+
+class RealClock:
+    # An object in this class tells the real time since the game started
+
+    def __init__(self):
+        self.start = time.perf_counter()
+
+    def ticks(self):
+        # Return the milliseconds since the game started.
+        return int((time.perf_counter() - self.start) * 1000)
+
+    def frame(self, elapsed_ms):
+        # Return how much time a frame took, given what pygame's Clock measured.
+        return elapsed_ms
+
+
+class VirtualClock:
+    # An object in this class tells a time that moves on by the same amount
+    # every frame, however long the frame really took, so a session can be
+    # played again exactly, at any speed.
+
+    def __init__(self, frame_ms):
+        # - frame_ms is the time every frame takes, in milliseconds
+        self.frame_ms = frame_ms
+        self.now = 0.0
+
+    def ticks(self):
+        return int(self.now)
+
+    def frame(self, elapsed_ms):
+        # Move on by one frame, ignoring the real elapsed time.
+        self.now += self.frame_ms
+        return self.frame_ms
+
+
+class InputLog:
+    # An object in this class holds the seed, clock rate and input events of a
+    # session, which is all it takes to play the session again.
+
+    def __init__(self, game, seed, frame_ms, options=None):
+        # Initialize an InputLog.
+        # - self is the InputLog to initialize
+        # - game is the name of the package that played, e.g. 'Memory'
+        # - seed is the seed of the game's random numbers
+        # - frame_ms is the VirtualClock's frame time
+        # - options are the keyword arguments the Game was made with
+        self.game = game
+        self.seed = seed
+        self.frame_ms = frame_ms
+        self.options = dict(options or {})
+        # (frame, kind, a, b) for every event, in the order they happened
+        self.events = []
+
+    def record(self, frame, kind, a=0, b=0):
+        self.events.append((frame, kind, int(a), int(b)))
+
+    def last_frame(self):
+        # Return the frame of the last event logged by frame, or -1 if there are none.
+        return max((event[0] for event in self.events if event[1] != PADDLE), default=-1)
+
+    def frames(self):
+        # Return a dict from frame number to the list of that frame's events,
+        # leaving out the PADDLE events.
+        by_frame = {}
+        for event in self.events:
+            if event[1] != PADDLE:
+                by_frame.setdefault(event[0], []).append(event)
+        return by_frame
+
+    def paddle_moves(self, paddle):
+        # Return the (step, direction) changes of one paddle, in order.
+        return [(event[0], event[3]) for event in self.events if event[1] == PADDLE and event[2] == paddle]
+
+    def save(self, path):
+        header = json.dumps({'game': self.game, 'seed': self.seed, 'frame_ms': self.frame_ms,
+                             'options': self.options}).encode('utf-8')
+        with open(path, 'wb') as log_file:
+            log_file.write(MAGIC)
+            log_file.write(HEADER_LENGTH.pack(len(header)))
+            log_file.write(header)
+            for event in self.events:
+                log_file.write(RECORD.pack(*event))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as log_file:
+            data = log_file.read()
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not an input log' % path)
+        start = len(MAGIC) + HEADER_LENGTH.size
+        length, = HEADER_LENGTH.unpack_from(data, len(MAGIC))
+        header = json.loads(data[start:start + length].decode('utf-8'))
+        log = cls(header['game'], header['seed'], header['frame_ms'], header['options'])
+        log.events = list(RECORD.iter_unpack(data[start + length:]))
+        return log
+
+
+def new_seed():
+    # Return a fresh random seed for a recorded session.
+    return random.SystemRandom().getrandbits(63)
+
+
+def recording_from_env(game, frame_ms, options=None):
+    # Return a new InputLog if the RECORD_VARIABLE environment variable names a
+    # file to record to, otherwise None.
+    if not os.environ.get(RECORD_VARIABLE):
+        return None
+    return InputLog(game, new_seed(), frame_ms, options)
+
+
+def save_recording(log):
+    # Write a log made by recording_from_env() to the file it was made for.
+    if log is not None:
+        log.save(os.environ[RECORD_VARIABLE])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play a recorded session again as fast as possible.')
+    parser.add_argument('log', help='the recorded input log')
+    parser.add_argument('--render', action='store_true', help='draw every frame (under the SDL dummy driver unless one is set)')
+    args = parser.parse_args(argv)
+
+    log = InputLog.load(args.log)
+    surface = None
+    if args.render:
+        os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    # the games are imported here, they import this module themselves
+    game_module = importlib.import_module(log.game)
+    import pygame
+    from common.startup import init_pygame
+    if args.render:
+        init_pygame()
+        surface = pygame.display.set_mode(game_module.WINDOW_SIZE)
+
+    start = time.perf_counter()
+    game = game_module.replay(log, surface)
+    seconds = time.perf_counter() - start
+    print('%s: %d frames in %.3f s, %.0f frames per second' % (log.game, game.frame, seconds, game.frame / seconds if seconds else 0))
+    print('final state: %s' % game.describe())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
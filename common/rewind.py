@@ -0,0 +1,48 @@
+class RewindBuffer:
+    # An object in this class keeps the most recent game state snapshots in a
+    # ring. Each snapshot object is made the first time its slot is needed and
+    # then written over, so once the ring is full capturing a state every frame
+    # allocates nothing, and a game that never fills it pays for no more.
+
+    def __init__(self, capacity, factory):
+        # Initialize a RewindBuffer.
+        # - self is the RewindBuffer to initialize
+        # - capacity is how many snapshots are kept, older ones are written over
+        # - factory makes one empty snapshot object, e.g. a state class
+        self.capacity = capacity
+        self.factory = factory
+        self.slots = []
+        # the slot the next snapshot goes into and how many are stored
+        self.next = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def push(self):
+        # Return the slot for a new snapshot, the caller fills it in.
+        if self.next == len(self.slots):
+            self.slots.append(self.factory())
+        slot = self.slots[self.next]
+        self.next = (self.next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        return slot
+
+    def peek(self):
+        # Return the newest snapshot without removing it, or None.
+        if self.count == 0:
+            return None
+        return self.slots[self.next - 1]
+
+    def pop(self):
+        # Remove and return the newest snapshot, or None when there are none.
+        # The returned object is only valid until the next push().
+        if self.count == 0:
+            return None
+        self.next = (self.next - 1) % self.capacity
+        self.count -= 1
+        return self.slots[self.next]
+
+    def clear(self):
+        self.next = 0
+        self.count = 0
@@ -0,0 +1,54 @@
+import pygame, time, warnings
+
+
+# How long a game may take from the start of main() until its loop starts, in milliseconds.
+STARTUP_BUDGET_MS = 500
+
+
+def init_pygame():
+    # Initialize only the pygame subsystems the games use: the display (which
+    # also brings the event queue) and fonts. pygame.init() would start audio,
+    # joysticks and the rest as well, and those are most of its cost.
+    pygame.display.init()
+    pygame.font.init()
+
+
+class StartupTimer:
+    # An object in this class measures the phases of a game's cold start and
+    # warns when the whole start goes over its budget.
+
+    def __init__(self, name, budget_ms=STARTUP_BUDGET_MS):
+        # Initialize a StartupTimer, the clock starts right away.
+        # - self is the StartupTimer to initialize
+        # - name is the game name used in the warning
+        # - budget_ms is the time the start may take in milliseconds
+        self.name = name
+        self.budget_ms = budget_ms
+        self.start = time.perf_counter()
+        self.last = self.start
+        # (phase name, milliseconds) for every phase marked so far
+        self.phases = []
+
+    def mark(self, phase):
+        # Record that a phase of the start has finished.
+        # - self is the StartupTimer
+        # - phase is the name of the phase
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def total_ms(self):
+        # Return the milliseconds from the start up to the last marked phase.
+        return (self.last - self.start) * 1000
+
+    def report(self):
+        # Return a one line summary of the phases and the total.
+        parts = ['%s %.1f ms' % phase for phase in self.phases]
+        return '%s startup: %s, total %.1f ms (budget %d ms)' % (self.name, ', '.join(parts), self.total_ms(), self.budget_ms)
+
+    def finish(self):
+        # Check the total against the budget and return it in milliseconds.
+        total = self.total_ms()
+        if total > self.budget_ms:
+            warnings.warn(self.report(), RuntimeWarning, stacklevel=2)
+        return total